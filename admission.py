@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+from functools import wraps
+from flask import Response, jsonify, make_response, request
+
+# Per client and endpoint: sustained requests per second and the burst allowed on top
+ADMISSION_RATE = float(os.getenv("ADMISSION_RATE", 0.5))
+ADMISSION_BURST = int(os.getenv("ADMISSION_BURST", 5))
+# Requests one worker handles at once per endpoint; the rest get a 429 instead of queueing
+ADMISSION_CONCURRENCY = int(os.getenv("ADMISSION_CONCURRENCY", 4))
+# Seconds a coalesced request waits for the identical one already running
+COALESCE_TIMEOUT = 30
+
+def too_many_requests(retry_after=1):
+    response = jsonify({"success": False, "message": "Too many requests, please try again shortly."})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+class TokenBucket:
+    """Token bucket per client; each request spends one token."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def allow(self, client):
+        now = time.monotonic()
+        with self.lock:
+            tokens, last = self.buckets.get(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            allowed = tokens >= 1
+            self.buckets[client] = (tokens - 1 if allowed else tokens, now)
+            if len(self.buckets) > 10000:
+                self._prune(now)
+        return allowed
+
+    def _prune(self, now):
+        # Clients whose bucket has refilled completely are the same as new ones
+        full_after = self.burst / self.rate
+        self.buckets = {client: state for client, state in self.buckets.items() if now - state[1] < full_after}
+
+class Admission:
+    """Rate limiting, a concurrency cap and coalescing for one endpoint.
+
+    Limits are per worker process. Requests with the same coalescing key
+    that arrive while one is running wait for it and share its response
+    rather than repeating the work.
+    """
+
+    def __init__(self, key=None, rate=ADMISSION_RATE, burst=ADMISSION_BURST, concurrency=ADMISSION_CONCURRENCY):
+        self.key = key
+        self.bucket = TokenBucket(rate, burst)
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.retry_after = max(int(1 / rate), 1)
+
+    def __call__(self, view):
+        @wraps(view)
+        def admitted(*args, **kwargs):
+            if not self.bucket.allow(request.remote_addr):
+                return too_many_requests(self.retry_after)
+            key = self.key(request) if self.key else None
+            if key is not None:
+                with self.lock:
+                    future = self.inflight.get(key)
+                    owner = future is None
+                    if owner:
+                        future = self.inflight[key] = Future()
+                if not owner:
+                    try:
+                        data, status, headers = future.result(COALESCE_TIMEOUT)
+                    except TimeoutError:
+                        return too_many_requests(self.retry_after)
+                    return Response(data, status=status, headers=headers)
+            try:
+                if not self.slots.acquire(blocking=False):
+                    response = too_many_requests(self.retry_after)
+                else:
+                    try:
+                        response = make_response(view(*args, **kwargs))
+                    finally:
+                        self.slots.release()
+                if key is not None:
+                    future.set_result((response.get_data(), response.status_code, list(response.headers)))
+                return response
+            except Exception as e:
+                if key is not None:
+                    future.set_exception(e)
+                raise
+            finally:
+                if key is not None:
+                    with self.lock:
+                        self.inflight.pop(key, None)
+        return admitted
+
+def json_field(name, normalize=str.strip, per_client=False):
+    """Coalescing key from a field of the JSON body, e.g. the email being subscribed.
+
+    With per_client the key also includes the client address, so only the
+    same client repeating itself is coalesced.
+    """
+    def key(request):
+        value = (request.get_json(silent=True) or {}).get(name)
+        if not isinstance(value, str) or not value.strip():
+            return None
+        return (request.remote_addr, normalize(value)) if per_client else normalize(value)
+    return key
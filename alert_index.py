@@ -0,0 +1,94 @@
+from bisect import bisect_left
+from collections import defaultdict
+import numpy as np
+from stock_scoring import composite_score, load_score_weights
+
+# Numeric columns that can be sorted on, besides symbol
+SORT_COLUMNS = ["current_price", "macd", "signal", "rsi", "adx", "+di", "-di", "score", "highlight_streak"]
+MAX_PAGE_SIZE = 500
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class AlertIndex:
+    """Search, filter, sort and paginate one snapshot without scanning every entry.
+
+    Symbols are kept sorted for prefix lookups, company names are indexed by
+    word prefix and by trigram, and every sortable column has a precomputed
+    ordering.
+    """
+
+    def __init__(self, entries):
+        self.entries = entries
+        weights = load_score_weights()
+        for entry in entries:
+            if "score" not in entry:
+                try:
+                    entry["score"] = round(composite_score(entry, weights), 4)
+                except Exception:
+                    entry["score"] = None
+        symbols = [entry["symbol"].upper() for entry in entries]
+        self.symbol_order = sorted(range(len(entries)), key=symbols.__getitem__)
+        self.sorted_symbols = [symbols[i] for i in self.symbol_order]
+        self.names = [(entry.get("company_name") or "").lower() for entry in entries]
+        self.trigrams = defaultdict(set)
+        words = []
+        for i, name in enumerate(self.names):
+            for trigram in _trigrams(name):
+                self.trigrams[trigram].add(i)
+            words.extend((word, i) for word in name.split())
+        words.sort()
+        self.words = [word for word, _ in words]
+        self.word_ids = [i for _, i in words]
+        self.highlighted = np.array([bool(entry.get("highlighted")) for entry in entries], dtype=bool)
+        self.orderings = {"symbol": np.array(self.symbol_order, dtype=np.int64)}
+        for column in SORT_COLUMNS:
+            values = np.array([entry.get(column) if isinstance(entry.get(column), (int, float)) else np.nan
+                               for entry in entries], dtype=float)
+            # Missing values sort last in both directions
+            self.orderings[column] = np.argsort(np.nan_to_num(values, nan=np.inf), kind="stable")
+            self.orderings[f"-{column}"] = np.argsort(np.nan_to_num(-values, nan=np.inf), kind="stable")
+        self.orderings["-symbol"] = self.orderings["symbol"][::-1]
+
+    def _prefix_range(self, keys, prefix):
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + "\uffff", start)
+        return start, end
+
+    def match(self, query):
+        """Return ids of entries whose symbol starts with, or company name contains, the query."""
+        query = query.strip()
+        start, end = self._prefix_range(self.sorted_symbols, query.upper())
+        ids = set(self.symbol_order[start:end])
+        lowered = query.lower()
+        if len(lowered) >= 3:
+            candidates = None
+            for trigram in _trigrams(lowered):
+                postings = self.trigrams.get(trigram, set())
+                candidates = postings if candidates is None else candidates & postings
+                if not candidates:
+                    break
+            ids.update(i for i in candidates or () if lowered in self.names[i])
+        else:
+            start, end = self._prefix_range(self.words, lowered)
+            ids.update(self.word_ids[start:end])
+        return ids
+
+    def search(self, query="", highlighted=None, sort="symbol", page=1, page_size=50):
+        """Return (total, entries) for one page of the matching, sorted entries."""
+        if sort not in self.orderings:
+            raise ValueError(f"Cannot sort by {sort}")
+        page = max(page, 1)
+        page_size = min(max(page_size, 1), MAX_PAGE_SIZE)
+        ordering = self.orderings[sort]
+        mask = None
+        if query.strip():
+            mask = np.zeros(len(self.entries), dtype=bool)
+            mask[list(self.match(query))] = True
+        if highlighted is not None:
+            wanted = self.highlighted if highlighted else ~self.highlighted
+            mask = wanted if mask is None else mask & wanted
+        if mask is not None:
+            ordering = ordering[mask[ordering]]
+        offset = (page - 1) * page_size
+        return len(ordering), [self.entries[i] for i in ordering[offset:offset + page_size]]
@@ -1,207 +1,396 @@
-from flask import Flask, request, jsonify, send_from_directory, Response
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
-from googleapiclient.discovery import build
-from google.oauth2.service_account import Credentials
 import os
 from dotenv import load_dotenv
-import time
 import json
+import threading
+import time
+from stock_scoring import rank_stocks
+from snapshot_db import load_snapshot_json
+from snapshot import DATA_PATH, COMPRESSED_SUFFIXES, SnapshotCache, versioned_path, version_path, changes_since
+from snapshot_history import read_history
+from request_log import RequestLog
+from prepared_response import PreparedResponse
+from alert_index import AlertIndex, MAX_PAGE_SIZE
+from broadcast import Broadcaster
+from serving import run_blocking, using_gevent
+from symbol_history import symbol_history, DEFAULT_HISTORY_POINTS
+from bar_store import last_bar_dates, load_series
+from charts import CHART_FORMATS, ChartRenderer, chart_frame_from_series, render_chart
+import subscribers
+from admission import Admission, json_field
+from static_assets import StaticAssets
+from metrics import metrics
+from health import HealthMonitor
+from datetime import date, timedelta
 
 # Load environment variables from .env file
 load_dotenv()
 
 # Flask setup
-app = Flask(__name__, static_folder="static")
+app = Flask(__name__, static_folder=None)
 CORS(app)
 
-# Global variables to store notification flag
-app.config['NEW_DATA'] = False
-
-# File to store user requested stocks
-REQUESTED_STOCKS_FILE = "requested_stocks.json"
-
-# Add a subscriber email to Google Sheets if it doesn't already exist
-def add_email_to_sheet(email):
-    creds = Credentials.from_service_account_file(
-        os.getenv("CREDENTIALS_FILE"),
-        scopes=["https://www.googleapis.com/auth/spreadsheets"]
-    )
-    service = build("sheets", "v4", credentials=creds)
-    sheet = service.spreadsheets()
-
-    # Fetch existing emails
-    result = sheet.values().get(
-        spreadsheetId=os.getenv("SubscriberList_SHEET_ID"),
-        range="A:A"
-    ).execute()
-    existing_emails = [row[0].strip().lower() for row in result.get("values", [])]
-
-    normalized_email = email.strip().lower()
-    if normalized_email in existing_emails:
-        return False, f"{email} is already subscribed."
-
-    sheet.values().append(
-        spreadsheetId=os.getenv("SubscriberList_SHEET_ID"),
-        range="A:A",
-        valueInputOption="USER_ENTERED",
-        body={"values": [[email]]}
-    ).execute()
-
-    return True, f"Thank you for subscribing! {email} subscribed successfully."
-
-# Load the requested stocks data from a file
-def load_requested_stocks():
-    try:
-        with open(REQUESTED_STOCKS_FILE, "r") as file:
-            return json.load(file)
-    except FileNotFoundError:
-        return {}
-    except Exception as e:
-        print(f"Error loading requested stocks file: {e}")
-        return {}
-
-# Save the requested stocks data to a file
-def save_requested_stocks(data):
-    try:
-        with open(REQUESTED_STOCKS_FILE, "w") as file:
-            json.dump(data, file, indent=4)
-    except Exception as e:
-        print(f"Error saving requested stocks file: {e}")
+# Per-route request counts, latencies and in-flight requests for /metrics
+@app.before_request
+def start_request_metrics():
+    metrics.start()
+    request.environ["metrics.start"] = time.perf_counter()
+    metrics.inc("http_requests_in_flight")
+
+@app.after_request
+def record_request_metrics(response):
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.inc("http_requests_total", route=route, method=request.method, status=str(response.status_code))
+    metrics.observe("http_request_duration_seconds", time.perf_counter() - request.environ["metrics.start"], route=route)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    if "metrics.start" in request.environ:
+        metrics.inc("http_requests_in_flight", -1)
+
+# Pages and static files, fingerprinted and compressed once at startup
+static_assets = StaticAssets(os.path.join(app.root_path, "static"),
+                             ["index.html", "monitored-stocks.html", "yfinance-guide.html"], app.root_path)
+
+# Fans newly published snapshot versions out to every /events client
+# Its watcher's version also drives the snapshot caches below, so requests never read the version file
+broadcaster = Broadcaster()
+broadcaster.start()
+
+# Subscribe/unsubscribe go to the local store; this pushes them to the Sheet in batches
+sheet_writer = subscribers.SheetWriter()
+sheet_writer.start()
+
+# Snapshot freshness and last pipeline run, kept in memory for /healthz and /readyz
+health_monitor = HealthMonitor()
+health_monitor.start()
+
+# Log of user requested stocks, compacted into requested_stocks.json
+request_log = RequestLog()
+request_log.start()
+
+# Load a published snapshot version as JSON text, preferring the SQLite store
+def read_snapshot_version(version):
+    if version:
+        run_id, body = load_snapshot_json(run_id=version)
+        if body is not None:
+            return body
+        if os.path.exists(versioned_path(version)):
+            with open(versioned_path(version), "r") as file:
+                return file.read()
+    with open(DATA_PATH, "r") as file:
+        return file.read()
+
+def current_version():
+    return broadcaster.version
+
+# Latest snapshot, swapped in once per version published by stockUpdates.py
+# The published file and its precompressed copies are mapped, so all workers share one copy in the page cache;
+# without them it is read and compressed on a native thread when serving with gevent, so open streams aren't stalled
+def load_prepared_snapshot(version):
+    with metrics.timer("snapshot_load_seconds"):
+        if version and os.path.exists(versioned_path(version)):
+            return PreparedResponse.for_snapshot_files(version, versioned_path(version), COMPRESSED_SUFFIXES)
+        return PreparedResponse.for_snapshot(version, read_snapshot_version(version))
+
+snapshot_cache = SnapshotCache(lambda version: run_blocking(load_prepared_snapshot, version),
+                               version_source=current_version)
+
+def load_snapshot_body():
+    return snapshot_cache.get()[1].text()
+
+# Search/sort index over the latest snapshot, rebuilt once per version
+def load_alert_index(version):
+    return AlertIndex(json.loads(read_snapshot_version(version)))
+
+alert_index_cache = SnapshotCache(lambda version: run_blocking(load_alert_index, version),
+                                  version_source=current_version)
+
+# Merged snapshot deltas per (since, version), dropped once a newer version is published
+delta_responses = {}
+delta_lock = threading.Lock()
+
+def prepared_changes(since):
+    version = snapshot_cache.get()[0]
+    response = delta_responses.get((since, version))
+    if response is None:
+        if since == version:
+            changes = {"from": since, "version": version, "changed": [], "removed": []}
+        else:
+            # Without a chain of deltas back to since, the client has to reload everything
+            changes = run_blocking(changes_since, since, version) or {"from": since, "version": version, "full": True}
+        response = PreparedResponse(json.dumps(changes), f"d{since}-{version}")
+        with delta_lock:
+            if len(delta_responses) >= 64 or any(key[1] != version for key in delta_responses):
+                delta_responses.clear()
+            delta_responses[(since, version)] = response
+    return response
+
+# Charts rendered on demand from the bar store, cached per (symbol, last bar date, width, format)
+chart_renderer = ChartRenderer()
+last_bars_cache = SnapshotCache(lambda version: run_blocking(last_bar_dates), version_source=current_version)
+
+def render_stored_chart(symbol, fmt, width):
+    series = load_series(symbol)
+    if series.empty:
+        return None
+    return render_chart(symbol, chart_frame_from_series(series), fmt=fmt, figsize=(width / 100, width / 100))
+
+# Query parameters answered from the alert index with a paginated result
+SEARCH_PARAMS = {"q", "sort", "order", "page", "page_size"}
+# Index filters; on their own they search too, except alongside rank=score, which applies them itself
+SEARCH_FILTERS = {"highlighted"}
+
+def wants_search(args):
+    keys = set(args)
+    return bool(SEARCH_PARAMS & keys or (SEARCH_FILTERS & keys and "rank" not in keys))
 
 # Handle subscription requests
 @app.route("/subscribe", methods=["POST"])
+@Admission(key=json_field("email", subscribers.normalize_email))
 def subscribe():
     data = request.get_json()
     email = data.get("email")
     if not email:
         return jsonify({"success": False, "message": "No email provided."}), 200
 
-    success, message = add_email_to_sheet(email)
+    # Recorded locally right away; the Sheet is updated in the background
+    success, message = run_blocking(subscribers.subscribe, email)
+    if success:
+        sheet_writer.poke()
     return jsonify({"success": success, "message": message}), 200
 
 # Handle unsubscription requests
 @app.route("/unsubscribe", methods=["POST"])
+@Admission(key=json_field("email", subscribers.normalize_email))
 def unsubscribe():
     data = request.get_json()
     email = data.get("email")
     if not email:
         return jsonify({"success": False, "message": "No email provided."}), 400
 
-    creds = Credentials.from_service_account_file(
-        os.getenv("CREDENTIALS_FILE"),
-        scopes=["https://www.googleapis.com/auth/spreadsheets"]
-    )
-    service = build("sheets", "v4", credentials=creds)
-    sheet = service.spreadsheets()
-
-    result = sheet.values().get(
-        spreadsheetId=os.getenv("SubscriberList_SHEET_ID"),
-        range="A:A"
-    ).execute()
-    values = result.get("values", [])
-    normalized_email = email.strip().lower()
-
-    for i, row in enumerate(values, start=1):
-        if row and row[0].strip().lower() == normalized_email:
-            for j in range(i + 1, len(values) + 1):
-                next_row = sheet.values().get(
-                    spreadsheetId=os.getenv("SubscriberList_SHEET_ID"),
-                    range=f"A{j}"
-                ).execute().get("values", [])
-                sheet.values().update(
-                    spreadsheetId=os.getenv("SubscriberList_SHEET_ID"),
-                    range=f"A{j-1}",
-                    valueInputOption="RAW",
-                    body={"values": next_row}
-                ).execute()
-
-            sheet.values().clear(
-                spreadsheetId=os.getenv("SubscriberList_SHEET_ID"),
-                range=f"A{len(values)}"
-            ).execute()
-
-            return jsonify({"success": True, "message": f"We're sad to see you go :( Unsubscribed {email} successfully."})
+    if run_blocking(subscribers.unsubscribe, email):
+        sheet_writer.poke()
+        return jsonify({"success": True, "message": f"We're sad to see you go :( Unsubscribed {email} successfully."})
 
     return jsonify({"success": False, "message": f"{email} not found."}), 404
 
 # Serve the main index HTML file
 @app.route("/")
 def serve_index():
-    return send_from_directory(".", "index.html")
+    return static_assets.page("index.html").respond(request)
 
 # Serve the YFinance guide HTML file
 @app.route("/yfinance-guide")
 def serve_yfinance_guide():
-    return send_from_directory(".", "yfinance-guide.html")
+    return static_assets.page("yfinance-guide.html").respond(request)
+
+# Serve static files; fingerprinted names (style.<hash>.css) are cached by browsers forever
+@app.route("/static/<path:filename>")
+def serve_static(filename):
+    asset = static_assets.asset(filename)
+    if asset is None:
+        return jsonify({"success": False, "message": "Not found."}), 404
+    return asset.respond(request)
 
 # Handle notification from stockUpdates.py
 @app.route("/notify", methods=["POST"])
 def notify():
-    app.config["NEW_DATA"] = True
+    broadcaster.poke()
     return jsonify({"success": True})
 
 # Serve the Monitored Stocks HTML file
 @app.route("/monitored-stocks")
 def serve_monitored_stocks():
-    return send_from_directory(".", "monitored-stocks.html")
+    return static_assets.page("monitored-stocks.html").respond(request)
 
 # Return a list of monitored stocks
 @app.route("/monitored-stocks-api", methods=["GET"])
 def get_monitored_stocks():
     try:
-        data_path = os.getenv("STOCK_DATA_PATH", "stock_data.json")
-        with open(data_path, "r") as file:
-            stocks = json.load(file)
-        return jsonify(stocks)
+        return snapshot_cache.get()[1].respond(request)
     except Exception as e:
         print(f"Error reading stock data: {e}")
         return jsonify([])  # Return an empty list if there's an error
 
 # Handle requests to add a new stock to monitoring
 @app.route("/request-stock", methods=["POST"])
+@Admission(key=json_field("symbol", str.upper, per_client=True))
 def request_stock():
     data = request.get_json()
     symbol = data.get("symbol")
     if not symbol:
         return jsonify({"success": False, "message": "No stock symbol provided."}), 400
 
-    # Load existing requested stocks
-    requested_stocks = load_requested_stocks()
-
-    # Update the count for the requested stock
+    # Append the request to the log; counts are compacted in the background of later requests
     symbol = symbol.upper()
-    if symbol in requested_stocks:
-        requested_stocks[symbol] += 1
-    else:
-        requested_stocks[symbol] = 1
-
-    # Save the updated data back to the file
-    save_requested_stocks(requested_stocks)
+    try:
+        run_blocking(request_log.append, symbol)
+    except Exception as e:
+        print(f"Error logging stock request: {e}")
+        return jsonify({"success": False, "message": "Error saving stock request."}), 500
 
     return jsonify({"success": True, "message": f"Requested monitoring for stock {symbol}."})
 
+# Return how many times each stock has been requested
+@app.route("/requested-stocks-api", methods=["GET"])
+def get_requested_stocks():
+    try:
+        return jsonify(run_blocking(request_log.totals))
+    except Exception as e:
+        print(f"Error reading requested stocks: {e}")
+        return jsonify({})
+
 # Stream updates to the client
 @app.route("/events")
 def events():
-    def generate():
-        while True:
-            if app.config.get("NEW_DATA", False):
-                app.config["NEW_DATA"] = False  # Reset flag
-                yield f"data: update\n\n"
-            time.sleep(1)  # Check for updates every second
-    return Response(generate(), content_type="text/event-stream")
+    # On sync workers each open stream would hold a whole worker; a 204 tells EventSource
+    # not to reconnect, and the page polls for changes instead
+    if not (using_gevent() or request.environ.get("wsgi.multithread")):
+        return Response(status=204)
+    # Reconnecting clients send the last version they saw and get any newer one straight away
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    return Response(broadcaster.stream(last_event_id), content_type="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # Return the latest stock alerts
 @app.route("/stock-alerts", methods=["GET"])
 def get_stock_alerts():
     try:
-        data_path = os.getenv("STOCK_DATA_PATH", "stock_data.json")
-        with open(data_path, "r") as file:
-            alerts = json.load(file)
+        if not request.args:
+            return snapshot_cache.get()[1].respond(request)
+        # Search, sort and page, e.g. /stock-alerts?q=app&sort=rsi&order=desc&page=2&page_size=50
+        if wants_search(request.args):
+            version, index = alert_index_cache.get()
+            sort = request.args.get("sort", "symbol")
+            if request.args.get("order") == "desc":
+                sort = f"-{sort}"
+            highlighted = request.args.get("highlighted")
+            page = max(request.args.get("page", default=1, type=int), 1)
+            page_size = min(max(request.args.get("page_size", default=50, type=int), 1), MAX_PAGE_SIZE)
+            try:
+                total, results = index.search(
+                    request.args.get("q", ""),
+                    highlighted=None if highlighted is None else highlighted == "true",
+                    sort=sort, page=page, page_size=page_size,
+                )
+            except ValueError as e:
+                return jsonify({"success": False, "message": str(e)}), 400
+            return jsonify({"version": version, "total": total, "page": page, "page_size": page_size, "results": results})
+        alerts = json.loads(load_snapshot_body())
+        # Optionally keep only a cross-sectional percentile band, e.g. ?min_pct=return_63d:0.9
+        if request.args.get("min_pct"):
+            field, _, threshold = request.args["min_pct"].partition(":")
+            try:
+                threshold = float(threshold or 0)
+            except ValueError:
+                return jsonify({"success": False, "message": f"Invalid min_pct threshold {threshold!r}."}), 400
+            alerts = [alert for alert in alerts
+                      if alert.get("cross_section", {}).get(f"{field}_pct", -1) >= threshold]
+        # Optionally rank by composite score, e.g. /stock-alerts?rank=score&limit=20
+        if request.args.get("rank") == "score":
+            if request.args.get("highlighted") == "true":
+                alerts = [alert for alert in alerts if alert.get("highlighted")]
+            limit = request.args.get("limit", type=int)
+            alerts = rank_stocks(alerts, limit)
         return jsonify(alerts)
     except Exception as e:
         print(f"Error reading stock data file: {e}")
         return jsonify({"success": False, "message": "Error reading stock data."}), 500
 
+# Return only the alerts that changed since a snapshot version, e.g. /stock-alerts/changes?since=41
+@app.route("/stock-alerts/changes", methods=["GET"])
+def get_stock_alert_changes():
+    since = request.args.get("since", type=int)
+    if since is None:
+        return jsonify({"success": False, "message": "No since version provided."}), 400
+    try:
+        return prepared_changes(since).respond(request)
+    except Exception as e:
+        print(f"Error reading snapshot changes: {e}")
+        return jsonify({"success": False, "message": "Error reading snapshot changes."}), 500
+
+# Return aligned OHLC and indicator series from the bar store, e.g. /api/symbol/ABBV/history?days=365&points=300
+@app.route("/api/symbol/<symbol>/history", methods=["GET"])
+def get_symbol_history(symbol):
+    days = request.args.get("days", default=365, type=int)
+    try:
+        start = request.args.get("start")
+        start = date.fromisoformat(start) if start else date.today() - timedelta(days=days)
+        end = request.args.get("end")
+        end = date.fromisoformat(end) if end else None
+    except ValueError:
+        return jsonify({"success": False, "message": "Dates must be formatted as YYYY-MM-DD."}), 400
+    points = request.args.get("points", default=DEFAULT_HISTORY_POINTS, type=int)
+    try:
+        history = run_blocking(symbol_history, symbol.upper(), start, end, points)
+    except Exception as e:
+        print(f"Error reading symbol history: {e}")
+        return jsonify({"success": False, "message": "Error reading symbol history."}), 500
+    if history is None:
+        return jsonify({"success": False, "message": f"No stored bars for {symbol.upper()}."}), 404
+    return jsonify(history)
+
+# Serve the alert email's 4-panel chart for a symbol, e.g. /chart/ABBV.png or /chart/ABBV.svg?width=800
+@app.route("/chart/<symbol>.<fmt>", methods=["GET"])
+def get_chart_image(symbol, fmt):
+    symbol = symbol.upper()
+    width = min(max(request.args.get("width", default=1200, type=int), 400), 2400)
+    if fmt not in CHART_FORMATS:
+        return jsonify({"success": False, "message": f"Unsupported chart format {fmt}."}), 404
+    try:
+        version, last_bars = last_bars_cache.get()
+        last_bar = last_bars.get(symbol)
+        chart = None
+        if last_bar is not None:
+            # The version keeps a chart drawn from an intraday bar from outliving its republication
+            chart = chart_renderer.get((symbol, str(last_bar), version, width, fmt),
+                                       render_stored_chart, symbol, fmt, width)
+    except Exception as e:
+        print(f"Error rendering chart for {symbol}: {e}")
+        return jsonify({"success": False, "message": "Error rendering chart."}), 500
+    if chart is None:
+        return jsonify({"success": False, "message": f"No stored bars for {symbol}."}), 404
+    return Response(chart, mimetype=CHART_FORMATS[fmt], headers={"Cache-Control": "public, max-age=300"})
+
+# Report data freshness and the last pipeline run; always 200 while the app is up
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    state = health_monitor.state
+    published_at = state.get("snapshot_published_at")
+    age = round(time.time() - published_at) if published_at else None
+    return jsonify({"status": "ok" if state["ready"] else "degraded", "snapshot_age_seconds": age, **state})
+
+# 503 while there is no snapshot, the bars are stale or the last run had failures
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    state = health_monitor.state
+    return jsonify({"ready": state["ready"], "reasons": state["reasons"]}), 200 if state["ready"] else 503
+
+# Expose metrics from every worker in Prometheus text format
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    gauges = {}
+    try:
+        gauges["snapshot_version"] = snapshot_cache.version if snapshot_cache.version is not None else 0
+        gauges["snapshot_age_seconds"] = time.time() - os.path.getmtime(version_path())
+    except OSError:
+        pass
+    return Response(metrics.render(gauges), mimetype="text/plain; version=0.0.4")
+
+# Return a symbol's stored snapshot history, e.g. /stock-history/ABBV?days=30
+@app.route("/stock-history/<symbol>", methods=["GET"])
+def get_stock_history(symbol):
+    days = request.args.get("days", default=30, type=int)
+    try:
+        history = read_history(symbols=[symbol.upper()], start=date.today() - timedelta(days=days))
+        history["date"] = history["date"].astype(str)
+        return Response(history.to_json(orient="records"), mimetype="application/json")
+    except Exception as e:
+        print(f"Error reading stock history: {e}")
+        return jsonify({"success": False, "message": "Error reading stock history."}), 500
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=False)
\ No newline at end of file
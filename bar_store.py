@@ -0,0 +1,100 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Directory holding the daily bar panel written by stockUpdates.py
+BAR_STORE_DIR = os.getenv("BAR_STORE_DIR", "bars")
+BAR_FIELDS = ["Open", "High", "Low", "Close", "Volume"]
+# Long-format bars and indicators, sorted by symbol so one symbol reads only its row groups
+SERIES_FILE = "series.parquet"
+SERIES_ROW_GROUP_SIZE = 50_000
+
+def build_panel(stock_data, fields=BAR_FIELDS):
+    """Turn {symbol: OHLCV DataFrame} into {field: dates x symbols DataFrame}."""
+    frames = {}
+    for symbol, df in stock_data.items():
+        if df is None or df.empty:
+            continue
+        if isinstance(df.columns, pd.MultiIndex):
+            df = df.copy()
+            df.columns = df.columns.get_level_values(-1)
+        frames[symbol] = df
+    if not frames:
+        return {}
+    combined = pd.concat(frames, axis=1).sort_index()
+    available = set(combined.columns.get_level_values(1))
+    return {field: combined.xs(field, axis=1, level=1) for field in fields if field in available}
+
+def _field_path(field, store_dir):
+    return os.path.join(store_dir, f"{field.lower()}.pkl")
+
+def save_panel(panel, store_dir=BAR_STORE_DIR):
+    """Write each field of the panel to the bar store, replacing the old files atomically."""
+    try:
+        os.makedirs(store_dir, exist_ok=True)
+        for field, frame in panel.items():
+            path = _field_path(field, store_dir)
+            frame.to_pickle(path + ".tmp")
+            os.replace(path + ".tmp", path)
+        symbol_count = panel["Close"].shape[1] if "Close" in panel else 0
+        print(f"Saved {len(panel)} bar fields for {symbol_count} symbols to {store_dir}")
+    except Exception as e:
+        print(f"Error saving bar panel: {e}")
+
+def load_panel(fields=BAR_FIELDS, store_dir=BAR_STORE_DIR):
+    """Load the requested fields from the bar store; missing fields are left out."""
+    panel = {}
+    for field in fields:
+        path = _field_path(field, store_dir)
+        if not os.path.exists(path):
+            continue
+        try:
+            panel[field] = pd.read_pickle(path)
+        except Exception as e:
+            print(f"Error loading {field} bars: {e}")
+    return panel
+
+def last_bar_dates(store_dir=BAR_STORE_DIR):
+    """Return {symbol: date of its last stored bar} from the Close panel."""
+    close = load_panel(["Close"], store_dir).get("Close")
+    if close is None:
+        return {}
+    return {symbol: close[symbol].last_valid_index() for symbol in close.columns}
+
+def save_series(panel, indicators, store_dir=BAR_STORE_DIR):
+    """Write bars and indicator history as one (symbol, date) table for per-symbol reads."""
+    try:
+        close = panel["Close"].sort_index(axis=1)
+        frames = {field.lower(): frame for field, frame in panel.items()}
+        frames.update(indicators)
+        # Transposing each aligned dates x symbols frame gives symbol-major, date-sorted rows
+        series = pd.DataFrame({
+            "symbol": np.repeat(close.columns.to_numpy(), len(close.index)),
+            "date": np.tile(close.index.to_numpy(), len(close.columns)),
+        })
+        for name, frame in frames.items():
+            # float32 halves the file; volume stays float64 so large counts keep every digit
+            dtype = "float64" if name == "volume" else "float32"
+            values = frame.reindex(index=close.index, columns=close.columns).to_numpy(dtype=dtype)
+            series[name] = values.T.ravel()
+        series = series[series[list(frames)].notna().any(axis=1)]
+        os.makedirs(store_dir, exist_ok=True)
+        path = os.path.join(store_dir, SERIES_FILE)
+        series.to_parquet(path + ".tmp", index=False, row_group_size=SERIES_ROW_GROUP_SIZE)
+        os.replace(path + ".tmp", path)
+        print(f"Saved {len(series)} rows of bar and indicator history to {path}")
+    except Exception as e:
+        print(f"Error saving bar and indicator history: {e}")
+
+def load_series(symbol, start=None, end=None, store_dir=BAR_STORE_DIR):
+    """Return one symbol's stored bars and indicators indexed by date, or an empty DataFrame."""
+    path = os.path.join(store_dir, SERIES_FILE)
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    filters = [("symbol", "==", symbol)]
+    if start is not None:
+        filters.append(("date", ">=", pd.Timestamp(start)))
+    if end is not None:
+        filters.append(("date", "<=", pd.Timestamp(end)))
+    series = pd.read_parquet(path, filters=filters)
+    return series.drop(columns="symbol").set_index("date").sort_index()
@@ -0,0 +1,81 @@
+import os
+import threading
+from metrics import metrics
+from snapshot import DATA_PATH, read_version
+
+# Seconds between checks of the published snapshot version
+SNAPSHOT_POLL_SECONDS = float(os.getenv("SNAPSHOT_POLL_SECONDS", 2))
+# Seconds between keep-alive comments on an idle event stream
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", 15))
+
+class Broadcaster:
+    """Fans snapshot version changes out to every event stream in this worker.
+
+    One watcher thread per worker polls the version file that stockUpdates.py
+    publishes, so every worker sees every update no matter which one received
+    /notify. Connected clients block on a shared condition until the version
+    moves or a heartbeat is due.
+    """
+
+    def __init__(self, data_path=DATA_PATH, poll_seconds=SNAPSHOT_POLL_SECONDS,
+                 heartbeat_seconds=SSE_HEARTBEAT_SECONDS):
+        self.data_path = data_path
+        self.poll_seconds = poll_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.version = read_version(data_path)
+        self.condition = threading.Condition()
+        self.wake = threading.Event()
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def start(self):
+        # Started lazily so each forked worker runs its own watcher
+        with self.lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                threading.Thread(target=self._watch, name="snapshot-watcher", daemon=True).start()
+
+    def _watch(self):
+        while True:
+            self.wake.wait(self.poll_seconds)
+            self.wake.clear()
+            self.check()
+
+    def check(self):
+        version = read_version(self.data_path)
+        if version != self.version:
+            with self.condition:
+                self.version = version
+                self.condition.notify_all()
+
+    def poke(self):
+        """Check the version now instead of at the next poll."""
+        self.start()
+        self.wake.set()
+
+    def wait(self, seen, timeout):
+        """Block until the version differs from seen or timeout passes; return the version."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.version != seen, timeout)
+            return self.version
+
+    def stream(self, last_event_id=None):
+        """Yield server-sent events; both the event id and data are the new snapshot version."""
+        self.start()
+        try:
+            seen = int(last_event_id)
+        except (TypeError, ValueError):
+            seen = self.version
+        metrics.inc("sse_connections")
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                version = self.wait(seen, self.heartbeat_seconds)
+                if version == seen:
+                    yield ": ping\n\n"
+                else:
+                    seen = version
+                    yield f"id: {version}\ndata: {version}\n\n"
+        finally:
+            # Runs when the client disconnects and the server closes the generator
+            metrics.inc("sse_connections", -1)
@@ -0,0 +1,55 @@
+import hashlib
+import json
+import os
+
+# Rendered charts keyed by content hash, evicted least-recently-used first
+CHART_CACHE_DIR = os.getenv("CHART_CACHE_DIR", os.path.join("charts", "cache"))
+CHART_CACHE_MAX_ENTRIES = int(os.getenv("CHART_CACHE_MAX_ENTRIES", 500))
+
+def chart_key(symbol, last_bar_date, params, stock_metrics=None):
+    """Hash of everything that determines a chart's pixels.
+
+    stock_metrics is the snapshot entry the labels are drawn from, so an
+    intraday rerun on the same bar date gets a new key.
+    """
+    payload = json.dumps([symbol, str(last_bar_date), params, stock_metrics], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def _path(key, extension, cache_dir):
+    return os.path.join(cache_dir, f"{key}.{extension}")
+
+def get_chart(key, extension="png", cache_dir=CHART_CACHE_DIR):
+    """Return the cached chart bytes, or None on a miss."""
+    path = _path(key, extension, cache_dir)
+    try:
+        with open(path, "rb") as file:
+            data = file.read()
+    except FileNotFoundError:
+        return None
+    # Touch the file so eviction by modification time is least-recently-used
+    os.utime(path)
+    return data
+
+def put_chart(key, data, extension="png", cache_dir=CHART_CACHE_DIR, max_entries=CHART_CACHE_MAX_ENTRIES):
+    """Store chart bytes under key and evict the least recently used charts over the limit."""
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _path(key, extension, cache_dir)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(data)
+    os.replace(tmp_path, path)
+    evict(cache_dir, max_entries)
+
+def evict(cache_dir=CHART_CACHE_DIR, max_entries=CHART_CACHE_MAX_ENTRIES):
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and not entry.name.endswith(".tmp"):
+            entries.append((entry.stat().st_mtime, entry.path))
+    if len(entries) <= max_entries:
+        return
+    entries.sort()
+    for _, path in entries[:len(entries) - max_entries]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,237 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.dates as mdates
+from matplotlib.figure import Figure
+import indicators
+from serving import run_blocking
+
+# Rendered charts kept in memory per web worker, and how many may render at once
+CHART_MEMORY_CACHE_SIZE = int(os.getenv("CHART_MEMORY_CACHE_SIZE", 200))
+CHART_RENDER_WORKERS = int(os.getenv("CHART_RENDER_WORKERS", 2))
+# Trading days shown on the chart (~6 months)
+CHART_WINDOW = 126
+CHART_FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+
+# Stored series columns (bar_store.save_series) and the names the chart draws them under
+SERIES_COLUMNS = {
+    "close": "Close", "ma8": "MA8", "ma20": "MA20", "ma50": "MA50", "ma200": "MA200",
+    "macd": "MACD", "signal": "Signal", "histogram": "Histogram", "rsi": "RSI",
+    "adx": "ADX", "plus_di": "+DI", "minus_di": "-DI",
+}
+
+def chart_frame(data):
+    """Compute every plotted series from daily High/Low/Close bars."""
+    df = data[['High', 'Low', 'Close']].copy()
+    for period, series in indicators.moving_averages(df['Close'], [8, 20, 50, 200]).items():
+        df[f'MA{period}'] = series
+    df['MACD'], df['Signal'] = indicators.macd(df['Close'])
+    df['Histogram'] = df['MACD'] - df['Signal']
+    df['RSI'] = indicators.rsi(df['Close'])
+    adx, plus_di, minus_di = indicators.adx(df['High'], df['Low'], df['Close'])
+    df['ADX'], df['+DI'], df['-DI'] = adx.fillna(0), plus_di.fillna(0), minus_di.fillna(0)
+    return df
+
+def chart_frame_from_series(series):
+    """Map a symbol's stored bar and indicator history onto the chart's columns."""
+    df = series[list(SERIES_COLUMNS)].rename(columns=SERIES_COLUMNS).astype(float)
+    df[['ADX', '+DI', '-DI']] = df[['ADX', '+DI', '-DI']].fillna(0)
+    return df
+
+def _metric(stock_metrics, name, fallback):
+    if stock_metrics is None:
+        return float(fallback)
+    value = stock_metrics[name]
+    return float(value if isinstance(value, (int, float)) else value.item())
+
+def render_chart(symbol, df, stock_metrics=None, fmt="png", figsize=(12, 12), dpi=100):
+    """Draw the 4-panel price/MACD/RSI/ADX chart and return the encoded image bytes.
+
+    Labels show the values from stock_metrics (the snapshot entry) when
+    given, otherwise the last plotted values. Uses the object-oriented
+    matplotlib API, so charts can render on several threads at once.
+    Returns None if the data can't be charted.
+    """
+    # Slice last 6 months for plotting (~126 trading days)
+    df_plot = df.iloc[-CHART_WINDOW:] if len(df) > CHART_WINDOW else df
+    # Verify data integrity
+    required_columns = ['Close', 'MA8', 'MA20', 'MA50', 'MA200', 'MACD', 'Signal', 'Histogram', 'RSI', 'ADX', '+DI', '-DI']
+    missing_columns = [col for col in required_columns if col not in df_plot.columns]
+    if missing_columns:
+        print(f"Missing columns for {symbol}: {missing_columns}")
+        return None
+    if df_plot[required_columns].isnull().all().any():
+        print(f"Invalid data for {symbol}: contains all NaN for some indicators")
+        return None
+    # Skip MA200 plotting if too few valid points
+    ma200_valid = df_plot['MA200'].dropna()
+    if len(ma200_valid) < len(df_plot) * 0.5:
+        ma200_valid = pd.Series(dtype=float)  # Empty series to skip plotting
+    last = df_plot.iloc[-1]
+    moving_averages = stock_metrics["moving_averages"] if stock_metrics is not None else {}
+    # Extract latest metrics safely
+    current_price = _metric(stock_metrics, "current_price", last['Close'])
+    ma8 = float(moving_averages.get("8", last['MA8']))
+    ma20 = float(moving_averages.get("20", last['MA20']))
+    ma50 = float(moving_averages.get("50", last['MA50']))
+    ma200 = float(moving_averages.get("200", last['MA200']))
+    macd = _metric(stock_metrics, "macd", last['MACD'])
+    signal = _metric(stock_metrics, "signal", last['Signal'])
+    rsi = _metric(stock_metrics, "rsi", last['RSI'])
+    adx = _metric(stock_metrics, "adx", last['ADX'])
+    plus_di = _metric(stock_metrics, "+di", last['+DI'])
+    minus_di = _metric(stock_metrics, "-di", last['-DI'])
+    # Create figure
+    fig = Figure(figsize=figsize)
+    axs = fig.subplots(4, 1, sharex=True, gridspec_kw={'height_ratios': [3, 1, 1, 1]})
+    fig.suptitle(f"{symbol} Stock Chart (6 Months)", fontsize=14, weight='bold', y=0.98)
+    x_right = df_plot.index[-1] + pd.Timedelta(days=0.5)  # Tighter horizontal spacing
+    # ----- Panel 1: Price and MAs -----
+    axs[0].plot(df_plot.index, df_plot['Close'], label='Close', color='blue')
+    axs[0].plot(df_plot.index, df_plot['MA8'], label='8-day MA', color='red')
+    axs[0].plot(df_plot.index, df_plot['MA20'], label='20-day MA', color='green')
+    axs[0].plot(df_plot.index, df_plot['MA50'], label='50-day MA', color='orange')
+    if len(ma200_valid) > 0:
+        axs[0].plot(ma200_valid.index, ma200_valid, label='200-day MA', color='purple')
+    axs[0].set_ylabel('Price ($)', fontsize=10)
+    axs[0].legend(loc='upper left', fontsize=8)
+    axs[0].grid(True, linestyle='--', alpha=0.7)
+    # Custom y-offsets for price panel
+    price_values = [
+        ('Close', df_plot['Close'].iloc[-1].item(), current_price, 'blue'),
+        ('MA8', df_plot['MA8'].iloc[-1].item(), ma8, 'red'),
+        ('MA20', df_plot['MA20'].iloc[-1].item(), ma20, 'green'),
+        ('MA50', df_plot['MA50'].iloc[-1].item(), ma50, 'orange')
+    ]
+    if len(ma200_valid) > 0 and not pd.isna(df_plot['MA200'].iloc[-1]):
+        price_values.append(('MA200', df_plot['MA200'].iloc[-1].item(), ma200, 'purple'))
+    price_values.sort(key=lambda x: x[1], reverse=True)
+    price_range = df_plot['Close'].max() - df_plot['Close'].min()
+    offsets = [0.02, -0.02, 0.05, -0.05, 0.08][:len(price_values)]  # Tighter offsets
+    offsets = [o * price_range for o in offsets]
+    for i, (name, y_val, value, color) in enumerate(price_values):
+        text = f"{float(value):.2f}" if isinstance(value, (int, float)) else "N/A"
+        axs[0].text(x_right, y_val + offsets[i], text, color=color, fontsize=8, va='center', ha='left', weight='bold')
+    # ----- Panel 2: MACD -----
+    hist_diff = df_plot['Histogram'].diff()
+    colors = ['green' if h > 0 else 'red' for h in hist_diff]
+    colors[0] = 'green' if df_plot['Histogram'].iloc[0] > 0 else 'red'
+    axs[1].plot(df_plot.index, df_plot['MACD'], label='MACD', color='blue')
+    axs[1].plot(df_plot.index, df_plot['Signal'], label='Signal', color='red')
+    axs[1].bar(df_plot.index, df_plot['Histogram'], label='Histogram', color=colors, alpha=0.5)
+    axs[1].set_ylabel('MACD', fontsize=10)
+    axs[1].legend(loc='upper left', fontsize=8)
+    axs[1].grid(True, linestyle='--', alpha=0.7)
+    macd_values = [
+        ('MACD', df_plot['MACD'].iloc[-1].item(), macd, 'blue'),
+        ('Signal', df_plot['Signal'].iloc[-1].item(), signal, 'red')
+    ]
+    macd_values.sort(key=lambda x: x[1], reverse=True)
+    macd_range = df_plot['MACD'].max() - df_plot['MACD'].min()
+    macd_offsets = [0.01 * macd_range, -0.01 * macd_range]  # Tighter offsets
+    for i, (name, y_val, value, color) in enumerate(macd_values):
+        axs[1].text(x_right, y_val + macd_offsets[i], f"{float(value):.2f}",
+                    color=color, fontsize=8, va='center', ha='left', weight='bold')
+    # ----- Panel 3: RSI -----
+    last_rsi = df_plot['RSI'].iloc[-1].item()
+    axs[2].plot(df_plot.index, df_plot['RSI'], label='RSI', color='blue')
+    axs[2].axhline(70, color='red', linestyle='--', label='Overbought (70)')
+    axs[2].axhline(30, color='green', linestyle='--', label='Oversold (30)')
+    axs[2].set_ylabel('RSI', fontsize=10)
+    axs[2].legend(loc='upper left', fontsize=8)
+    axs[2].grid(True, linestyle='--', alpha=0.7)
+    axs[2].text(x_right, last_rsi, f"{float(rsi):.2f}",
+                color='blue', fontsize=8, va='center', ha='left', weight='bold')
+    # ----- Panel 4: ADX / +DI / -DI -----
+    last_adx = df_plot['ADX'].iloc[-1].item()
+    last_plus_di = df_plot['+DI'].iloc[-1].item()
+    last_minus_di = df_plot['-DI'].iloc[-1].item()
+    axs[3].plot(df_plot.index, df_plot['ADX'], label='ADX', color='black')
+    axs[3].plot(df_plot.index, df_plot['+DI'], label='+DI', color='green')
+    axs[3].plot(df_plot.index, df_plot['-DI'], label='-DI', color='red')
+    for i in range(1, len(df_plot)):
+        x = [df_plot.index[i-1], df_plot.index[i]]
+        y1 = [df_plot['+DI'].iloc[i-1].item(), df_plot['+DI'].iloc[i].item()]
+        y2 = [df_plot['-DI'].iloc[i-1].item(), df_plot['-DI'].iloc[i].item()]
+        fill_color = 'green' if y1[-1] > y2[-1] else 'red'
+        axs[3].fill_between(x, y1, y2, color=fill_color, alpha=0.2)
+    axs[3].set_ylabel('ADX / DI', fontsize=10)
+    axs[3].legend(loc='upper left', fontsize=8)
+    axs[3].grid(True, linestyle='--', alpha=0.7)
+    adx_values = [
+        ('ADX', last_adx, adx, 'black'),
+        ('+DI', last_plus_di, plus_di, 'green'),
+        ('-DI', last_minus_di, minus_di, 'red')
+    ]
+    adx_values.sort(key=lambda x: x[1], reverse=True)
+    adx_range = df_plot['ADX'].max() - df_plot['ADX'].min()
+    adx_offsets = [0.015 * adx_range, -0.015 * adx_range, 0]  # Tighter offsets
+    for i, (name, y_val, value, color) in enumerate(adx_values):
+        axs[3].text(x_right, y_val + adx_offsets[i], f"{float(value):.2f}",
+                    color=color, fontsize=8, va='center', ha='left', weight='bold')
+    # X-axis formatting
+    axs[3].xaxis.set_major_locator(mdates.MonthLocator())
+    axs[3].xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
+    for label in axs[3].get_xticklabels():
+        label.set_rotation(45)
+        label.set_ha('right')
+    axs[3].set_xlabel('Date', fontsize=10)
+    fig.tight_layout(rect=[0, 0, 0.85, 0.95])
+    buffer = BytesIO()
+    fig.savefig(buffer, format=fmt, bbox_inches='tight', dpi=dpi)
+    return buffer.getvalue()
+
+class ChartRenderer:
+    """In-memory LRU of rendered charts with at most one render per key in flight.
+
+    Requests for a chart that is already rendering wait for that render
+    instead of starting another. Renders run on the renderer's own pool of
+    CHART_RENDER_WORKERS threads, so they never run on the request thread
+    whatever the worker class. Under gevent those threads are greenlets, so
+    each render is handed on to a native thread (see serving.run_blocking).
+    """
+
+    def __init__(self, max_entries=CHART_MEMORY_CACHE_SIZE, workers=CHART_RENDER_WORKERS):
+        self.max_entries = max_entries
+        self.workers = workers
+        self.cache = OrderedDict()
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.executor = None
+        self.pid = None
+
+    def _pool(self):
+        # Created lazily so each forked worker gets its own threads
+        if self.pid != os.getpid():
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="chart-render")
+            self.pid = os.getpid()
+        return self.executor
+
+    def get(self, key, render, *args):
+        """Return the cached bytes for key, or the result of render(*args) run once."""
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+            future = self.inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self.inflight[key] = self._pool().submit(run_blocking, render, *args)
+        if not owner:
+            return future.result()
+        try:
+            value = future.result()
+            if value is not None:
+                with self.lock:
+                    self.cache[key] = value
+                    while len(self.cache) > self.max_entries:
+                        self.cache.popitem(last=False)
+            return value
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
@@ -0,0 +1,94 @@
+import json
+import os
+import pickle
+import shutil
+import time
+from datetime import datetime
+
+# Directory holding one sub-directory of stage outputs per pipeline run
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", "checkpoints")
+# Number of run directories kept before the oldest are deleted
+CHECKPOINT_KEEP_RUNS = int(os.getenv("CHECKPOINT_KEEP_RUNS", 10))
+# Stage timings and outcomes of the latest run, read by the app's health endpoints
+RUN_STATUS_PATH = os.getenv("RUN_STATUS_PATH", "run_status.json")
+
+class RunCheckpoint:
+    """Stage outputs of one pipeline run, so a restart with the same run id resumes."""
+
+    def __init__(self, run_id=None, checkpoint_dir=CHECKPOINT_DIR, status_path=RUN_STATUS_PATH):
+        self.run_id = run_id or datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.checkpoint_dir = checkpoint_dir
+        self.run_dir = os.path.join(checkpoint_dir, self.run_id)
+        os.makedirs(self.run_dir, exist_ok=True)
+        self.status_path = status_path
+        self.status = {"run_id": self.run_id, "started_at": time.time(), "finished_at": None, "stages": {}, "failures": 0}
+
+    def _path(self, stage):
+        return os.path.join(self.run_dir, f"{stage}.pkl")
+
+    def done(self, stage):
+        return os.path.exists(self._path(stage))
+
+    def load(self, stage):
+        with open(self._path(stage), "rb") as file:
+            return pickle.load(file)
+
+    def save(self, stage, value):
+        path = self._path(stage)
+        with open(path + ".tmp", "wb") as file:
+            pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+
+    def record(self, stage, seconds, outcome):
+        """Add a stage's outcome (ok, empty, failed or resumed) to the run status file."""
+        self.status["stages"][stage] = {"seconds": round(seconds, 3), "outcome": outcome}
+        self.status["failures"] = sum(1 for entry in self.status["stages"].values() if entry["outcome"] in ("empty", "failed"))
+        self.write_status()
+
+    def write_status(self):
+        try:
+            with open(self.status_path + ".tmp", "w") as file:
+                json.dump(self.status, file, indent=4)
+            os.replace(self.status_path + ".tmp", self.status_path)
+        except Exception as e:
+            print(f"Error writing run status: {e}")
+
+    def finish(self):
+        self.status["finished_at"] = time.time()
+        self.write_status()
+
+    def timed(self, stage, func, *args, **kwargs):
+        """Run a stage without checkpointing it, recording its time and outcome."""
+        start = time.monotonic()
+        try:
+            value = func(*args, **kwargs)
+        except Exception:
+            self.record(stage, time.monotonic() - start, "failed")
+            raise
+        self.record(stage, time.monotonic() - start, "ok" if value else "empty")
+        return value
+
+    def run(self, stage, func, *args, **kwargs):
+        """Return the checkpointed output of a stage, running and saving it if needed.
+
+        Falsy outputs (an empty universe, a failed send) are not saved, so
+        the stage runs again when the run is resumed.
+        """
+        if self.done(stage):
+            print(f"[{self.run_id}] Resuming: reusing checkpointed stage '{stage}'")
+            self.record(stage, 0, "resumed")
+            return self.load(stage)
+        value = self.timed(stage, func, *args, **kwargs)
+        if value:
+            self.save(stage, value)
+        return value
+
+    def prune(self, keep=CHECKPOINT_KEEP_RUNS):
+        """Delete the oldest run directories, keeping this run and the newest others."""
+        runs = sorted(
+            (name for name in os.listdir(self.checkpoint_dir) if name != self.run_id),
+            key=lambda name: os.path.getmtime(os.path.join(self.checkpoint_dir, name)),
+            reverse=True,
+        )
+        for name in runs[max(keep - 1, 0):]:
+            shutil.rmtree(os.path.join(self.checkpoint_dir, name), ignore_errors=True)
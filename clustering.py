@@ -0,0 +1,65 @@
+import os
+import numpy as np
+from stock_scoring import top_k
+
+# Trading days of returns used for the correlation matrix
+CORRELATION_WINDOW = int(os.getenv("CORRELATION_WINDOW", 60))
+# Highlighted stocks at least this correlated with a representative are folded under it
+CLUSTER_THRESHOLD = float(os.getenv("CLUSTER_THRESHOLD", 0.7))
+
+def correlation_matrix(close, window=CORRELATION_WINDOW):
+    """Return (symbols, matrix) of daily log-return correlations over the last window.
+
+    Returns are standardized once so the whole matrix is a single matrix
+    product. Symbols without a full window of prices are left out.
+    """
+    returns = np.log(close.ffill().iloc[-(window + 1):].to_numpy(dtype=np.float64))
+    returns = np.diff(returns, axis=0)
+    complete = ~np.isnan(returns).any(axis=0)
+    returns = returns[:, complete]
+    returns -= returns.mean(axis=0)
+    std = returns.std(axis=0)
+    std[std == 0] = np.inf
+    standardized = (returns / (std * np.sqrt(len(returns)))).astype(np.float32)
+    symbols = list(close.columns[complete])
+    return symbols, standardized.T @ standardized
+
+def cluster_highlighted(entries, close, threshold=CLUSTER_THRESHOLD, window=CORRELATION_WINDOW):
+    """Group correlated highlighted stocks as {representative: [members]}.
+
+    The best-scoring unassigned stock becomes the representative of every
+    unassigned highlighted stock whose correlation with it passes the threshold.
+    """
+    highlighted = [entry for entry in entries if entry.get("highlighted")]
+    if not highlighted or close is None or close.empty:
+        return {}
+    symbols, corr = correlation_matrix(close, window)
+    position = {symbol: i for i, symbol in enumerate(symbols)}
+    ranked = [entry["symbol"] for _, entry in top_k(highlighted)]
+    indexed = [symbol for symbol in ranked if symbol in position]
+    sub = corr[np.ix_([position[s] for s in indexed], [position[s] for s in indexed])]
+    clusters = {symbol: [] for symbol in ranked if symbol not in position}
+    assigned = np.zeros(len(indexed), dtype=bool)
+    for i, symbol in enumerate(indexed):
+        if assigned[i]:
+            continue
+        members = np.flatnonzero(~assigned & (sub[i] >= threshold))
+        assigned[members] = True
+        assigned[i] = True
+        clusters[symbol] = [indexed[j] for j in members if j != i]
+    return clusters
+
+def attach_clusters(entries, clusters):
+    """Mark each highlighted entry with its representative and list members on representatives."""
+    representative_of = {}
+    for representative, members in clusters.items():
+        representative_of[representative] = representative
+        for member in members:
+            representative_of[member] = representative
+    for entry in entries:
+        symbol = entry["symbol"]
+        if symbol not in representative_of:
+            continue
+        entry["cluster"] = representative_of[symbol]
+        if symbol in clusters:
+            entry["cluster_members"] = clusters[symbol]
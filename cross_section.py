@@ -0,0 +1,67 @@
+import os
+import numpy as np
+import pandas as pd
+from stock_scoring import get_moving_average
+
+# Benchmark used for relative strength; it is fetched into the bar store with the universe
+BENCHMARK_SYMBOL = os.getenv("BENCHMARK_SYMBOL", "SPY")
+
+# Trading-day lookbacks: roughly 1 week, 1 month, 3 months and 6 months
+RETURN_WINDOWS = [5, 21, 63, 126]
+
+def window_returns(close, windows=RETURN_WINDOWS):
+    """Trailing returns of every column over each window, as a symbols x windows frame."""
+    close = close.ffill()
+    returns = {}
+    for window in windows:
+        if len(close) > window:
+            returns[f"return_{window}d"] = close.iloc[-1] / close.iloc[-1 - window] - 1
+    return pd.DataFrame(returns, index=close.columns)
+
+def indicator_frame(entries):
+    """Collect the per-symbol indicator values of the snapshot into one frame."""
+    rows = {}
+    for entry in entries:
+        price = entry["current_price"]
+        row = {
+            "rsi": entry["rsi"],
+            "adx": entry["adx"],
+            "macd_histogram": (entry["macd"] - entry["signal"]) / price * 100 if price else np.nan,
+        }
+        for period in (50, 200):
+            avg = get_moving_average(entry, period)
+            row[f"pct_above_ma{period}"] = (price - avg) / avg * 100 if avg else np.nan
+        rows[entry["symbol"]] = row
+    return pd.DataFrame.from_dict(rows, orient="index", dtype=float)
+
+def compute_cross_section(entries, close=None, windows=RETURN_WINDOWS, benchmark=BENCHMARK_SYMBOL):
+    """Percentile ranks and z-scores of returns and indicators across the universe.
+
+    Every statistic is a column-wise operation over the whole universe, so the
+    cost grows linearly with the number of symbols.
+    """
+    features = indicator_frame(entries)
+    if features.empty:
+        return features
+    extra = []
+    if close is not None and not close.empty:
+        returns = window_returns(close.reindex(columns=features.index), windows)
+        features = features.join(returns)
+        if benchmark in close.columns:
+            benchmark_returns = window_returns(close[[benchmark]], windows).iloc[0]
+            relative = (1 + returns) / (1 + benchmark_returns) - 1
+            extra.append(relative.rename(columns=lambda name: name.replace("return_", "rs_")))
+    ranks = features.rank(pct=True).add_suffix("_pct")
+    zscores = ((features - features.mean()) / features.std(ddof=0)).add_suffix("_z")
+    return_columns = [name for name in features.columns if name.startswith("return_")]
+    table = pd.concat([features[return_columns], *extra, ranks, zscores], axis=1)
+    return table.replace([np.inf, -np.inf], np.nan)
+
+def attach_cross_section(entries, table):
+    """Store each symbol's cross-sectional metrics on its entry, dropping missing values."""
+    if table.empty:
+        return
+    records = table.round(4).to_dict(orient="index")
+    for entry in entries:
+        metrics = records.get(entry["symbol"], {})
+        entry["cross_section"] = {name: value for name, value in metrics.items() if not pd.isna(value)}
@@ -0,0 +1,116 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+import numpy as np
+from pandas.tseries.holiday import (AbstractHolidayCalendar, GoodFriday, Holiday, USLaborDay, USMartinLutherKingJr,
+                                    USMemorialDay, USPresidentsDay, USThanksgivingDay, nearest_workday,
+                                    sunday_to_monday)
+from bar_store import last_bar_dates
+from checkpoint import RUN_STATUS_PATH
+from snapshot import DATA_PATH, read_version, version_path
+
+# Seconds between refreshes of the cached health state
+HEALTH_POLL_SECONDS = float(os.getenv("HEALTH_POLL_SECONDS", 10))
+# Completed trading sessions the stored bars may lag behind before the app reports not ready
+HEALTH_MAX_STALE_SESSIONS = int(os.getenv("HEALTH_MAX_STALE_SESSIONS", 1))
+MARKET_TIMEZONE = ZoneInfo("America/New_York")
+MARKET_CLOSE_HOUR = 16
+
+class TradingCalendar(AbstractHolidayCalendar):
+    """NYSE full-day holidays."""
+    rules = [
+        # A Saturday New Year's Day isn't made up on the Friday before
+        Holiday("New Year's Day", month=1, day=1, observance=sunday_to_monday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday("Juneteenth", month=6, day=19, start_date="2022-01-01", observance=nearest_workday),
+        Holiday("Independence Day", month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday("Christmas", month=12, day=25, observance=nearest_workday),
+    ]
+
+def missed_sessions(last_bar_date, now=None):
+    """Trading sessions that have closed since the last stored bar."""
+    now = now or datetime.now(MARKET_TIMEZONE)
+    holidays = TradingCalendar().holidays(str(last_bar_date.year), str(now.year + 1)).to_numpy(dtype="datetime64[D]")
+    # Today's session only counts once the market has closed
+    end = np.datetime64(now.date()) + (1 if now.hour >= MARKET_CLOSE_HOUR else 0)
+    start = np.datetime64(last_bar_date.date()) + 1
+    return max(int(np.busday_count(start, end, holidays=holidays)), 0)
+
+class HealthMonitor:
+    """Snapshot freshness and last pipeline run, refreshed in the background.
+
+    The endpoints only read the cached dict, so they never touch the disk.
+    The bar store is reread only when a new snapshot version is published.
+    """
+
+    def __init__(self, data_path=DATA_PATH, status_path=RUN_STATUS_PATH, poll_seconds=HEALTH_POLL_SECONDS):
+        self.data_path = data_path
+        self.status_path = status_path
+        self.poll_seconds = poll_seconds
+        self.state = {"ready": False, "reasons": ["Health state not loaded yet"]}
+        self.version = None
+        self.last_bar_date = None
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def start(self):
+        # Started lazily so each forked worker runs its own monitor
+        with self.lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                threading.Thread(target=self._run, name="health-monitor", daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error refreshing health state: {e}")
+            time.sleep(self.poll_seconds)
+
+    def refresh(self):
+        version = read_version(self.data_path)
+        if version != self.version:
+            dates = [day for day in last_bar_dates().values() if day is not None]
+            self.last_bar_date = max(dates) if dates else None
+            self.version = version
+        try:
+            published_at = os.path.getmtime(version_path(self.data_path))
+        except OSError:
+            published_at = None
+        try:
+            with open(self.status_path, "r") as file:
+                last_run = json.load(file)
+        except (OSError, ValueError):
+            last_run = None
+        behind = missed_sessions(self.last_bar_date) if self.last_bar_date is not None else None
+        reasons = []
+        if not version:
+            reasons.append("No snapshot has been published")
+        if behind is None:
+            reasons.append("No stored bars")
+        elif behind > HEALTH_MAX_STALE_SESSIONS:
+            reasons.append(f"Bars are {behind} trading sessions behind")
+        if last_run and last_run.get("failures"):
+            reasons.append(f"Last run {last_run['run_id']} had {last_run['failures']} failed stages")
+        if last_run and last_run.get("finished_at") is None and time.time() - last_run["started_at"] > 6 * 3600:
+            reasons.append(f"Last run {last_run['run_id']} never finished")
+        # Swapped in as one object so readers always see a consistent state
+        self.state = {
+            "ready": not reasons,
+            "reasons": reasons,
+            "snapshot_version": version,
+            "snapshot_published_at": published_at,
+            "last_bar_date": self.last_bar_date.strftime("%Y-%m-%d") if self.last_bar_date is not None else None,
+            "sessions_behind": behind,
+            "last_run": last_run,
+            "checked_at": time.time(),
+        }
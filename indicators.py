@@ -0,0 +1,51 @@
+import numpy as np
+
+# Indicator formulas shared by the daily pipeline and the resampled timeframes.
+# Each function accepts either a Series (one symbol) or a dates x symbols
+# DataFrame (the whole panel) and returns the same shape.
+
+def rma(x, n):
+    """Wilder's moving average."""
+    return x.ewm(alpha=1/n, adjust=False).mean()
+
+def moving_averages(close, periods):
+    return {period: close.rolling(window=period).mean() for period in periods}
+
+def macd(close):
+    """MACD line and its 9-period signal line."""
+    ema12 = close.ewm(span=12, adjust=False).mean()
+    ema26 = close.ewm(span=26, adjust=False).mean()
+    macd_line = ema12 - ema26
+    return macd_line, macd_line.ewm(span=9, adjust=False).mean()
+
+def rsi(close, period=14):
+    delta = close.diff(1)
+    gain = delta.where(delta > 0, 0)
+    loss = -delta.where(delta < 0, 0)
+    rs = rma(gain, period) / rma(loss, period)
+    return 100 - (100 / (1 + rs))
+
+def adx(high, low, close, n=14):
+    """ADX, +DI and -DI (unfilled; the first values are NaN)."""
+    previous_close = close.shift()
+    tr = np.fmax(np.fmax(high - low, (high - previous_close).abs()), (low - previous_close).abs())
+    up = high.diff().clip(lower=0)
+    down = (-low.diff()).clip(lower=0)
+    plus_dm = up.where(~(up < down), 0)
+    minus_dm = down.where(~(down < plus_dm), 0)
+    tr_rma = rma(tr, n)
+    plus_di = 100 * rma(plus_dm, n) / tr_rma
+    minus_di = 100 * rma(minus_dm, n) / tr_rma
+    dx = 100 * (plus_di - minus_di).abs() / (plus_di + minus_di).replace(0, np.nan)
+    return rma(dx, n), plus_di, minus_di
+
+# Moving averages kept in the stored indicator history
+HISTORY_MA_PERIODS = [8, 20, 50, 200]
+
+def indicator_panel(high, low, close):
+    """Every indicator series the history API serves, keyed by its column name."""
+    series = {f"ma{period}": frame for period, frame in moving_averages(close, HISTORY_MA_PERIODS).items()}
+    macd_line, signal_line = macd(close)
+    series.update(macd=macd_line, signal=signal_line, histogram=macd_line - signal_line, rsi=rsi(close))
+    series["adx"], series["plus_di"], series["minus_di"] = adx(high, low, close)
+    return series
@@ -0,0 +1,75 @@
+from gevent import monkey
+monkey.patch_all()
+
+import argparse
+import socket
+import time
+from urllib.parse import urlparse
+import gevent
+import requests
+
+# Hold many /events connections open against a running server and check it stays responsive, e.g.
+# python loadtest_sse.py --url http://localhost:5000 --clients 5000 --duration 60
+parser = argparse.ArgumentParser(description="SSE load test for app.py")
+parser.add_argument("--url", default="http://localhost:5000")
+parser.add_argument("--clients", type=int, default=2000)
+parser.add_argument("--duration", type=int, default=60, help="Seconds to hold the connections open")
+parser.add_argument("--ramp", type=float, default=10, help="Seconds over which clients connect")
+args = parser.parse_args()
+
+stats = {"connected": 0, "failed": 0, "dropped": 0, "updates": 0, "pings": 0}
+latencies = []
+
+def sse_client(host, port, deadline):
+    """Open one raw /events stream and count what arrives until the deadline."""
+    try:
+        sock = socket.create_connection((host, port), timeout=30)
+        sock.sendall(f"GET /events HTTP/1.1\r\nHost: {host}\r\nAccept: text/event-stream\r\n\r\n".encode())
+        buffer = sock.recv(4096)
+        if b" 200 " not in buffer.split(b"\r\n", 1)[0]:
+            stats["failed"] += 1
+            return
+        stats["connected"] += 1
+        sock.settimeout(None)
+        while time.time() < deadline:
+            with gevent.Timeout(max(deadline - time.time(), 0.1), False):
+                chunk = sock.recv(4096)
+                if not chunk:
+                    stats["dropped"] += 1
+                    return
+                stats["updates"] += chunk.count(b"data: ")
+                stats["pings"] += chunk.count(b": ping")
+        sock.close()
+    except Exception:
+        stats["failed"] += 1
+
+def probe(url, deadline):
+    """Time ordinary API requests while the streams are held open."""
+    while time.time() < deadline:
+        start = time.time()
+        try:
+            requests.get(f"{url}/stock-alerts", timeout=30)
+            latencies.append(time.time() - start)
+        except Exception:
+            latencies.append(float("inf"))
+        gevent.sleep(1)
+
+if __name__ == "__main__":
+    target = urlparse(args.url)
+    host, port = target.hostname, target.port or 80
+    deadline = time.time() + args.ramp + args.duration
+    clients = []
+    for i in range(args.clients):
+        clients.append(gevent.spawn(sse_client, host, port, deadline))
+        gevent.sleep(args.ramp / args.clients)
+    prober = gevent.spawn(probe, args.url, deadline)
+    while time.time() < deadline:
+        gevent.sleep(5)
+        print(f"open={stats['connected'] - stats['dropped']} failed={stats['failed']} "
+              f"updates={stats['updates']} pings={stats['pings']}")
+    gevent.joinall(clients + [prober])
+    latencies.sort()
+    if latencies:
+        print(f"/stock-alerts while loaded: p50={latencies[len(latencies) // 2] * 1000:.0f}ms "
+              f"max={latencies[-1] * 1000:.0f}ms over {len(latencies)} requests")
+    print(f"Connected {stats['connected']}/{args.clients}, failed {stats['failed']}, dropped {stats['dropped']}")
@@ -0,0 +1,183 @@
+import contextlib
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+# Each web worker writes its metrics here; /metrics merges every live worker's file
+METRICS_DIR = os.getenv("METRICS_DIR", "metrics")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", 5))
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+METRIC_TYPES = {
+    "http_requests_total": ("counter", "Requests handled, by route, method and status."),
+    "http_request_duration_seconds": ("histogram", "Time to produce a response, by route."),
+    "http_requests_in_flight": ("gauge", "Requests being handled right now."),
+    "sse_connections": ("gauge", "Open /events streams."),
+    "snapshot_load_seconds": ("histogram", "Time to map, or load and compress, a newly published snapshot."),
+    "sheets_request_seconds": ("histogram", "Google Sheets API call latency, by operation."),
+    "snapshot_version": ("gauge", "Snapshot version being served."),
+    "snapshot_age_seconds": ("gauge", "Seconds since the served snapshot was published."),
+}
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+class Metrics:
+    """Counters, gauges and histograms for one process, exposed in Prometheus text format.
+
+    Recording is a dict update under a lock. A background thread writes the
+    worker's values to METRICS_DIR so whichever worker is scraped can add
+    up all of them.
+    """
+
+    def __init__(self, metrics_dir=METRICS_DIR, flush_seconds=METRICS_FLUSH_SECONDS):
+        self.metrics_dir = metrics_dir
+        self.flush_seconds = flush_seconds
+        self.lock = threading.Lock()
+        self.values = defaultdict(float)
+        self.histograms = {}
+        self.pid = None
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] += value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            # Per-bucket counts (made cumulative when rendered), then sum and count
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0, 0]
+            histogram[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+
+    def timer(self, name, **labels):
+        return _Timer(self, name, labels)
+
+    def start(self):
+        # Started lazily so each forked worker runs its own flusher
+        with self.lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                threading.Thread(target=self._run, name="metrics-flusher", daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error writing metrics: {e}")
+
+    def _state(self):
+        with self.lock:
+            return {
+                "values": [[name, labels, value] for (name, labels), value in self.values.items()],
+                "histograms": [[name, labels, list(histogram)] for (name, labels), histogram in self.histograms.items()],
+            }
+
+    def flush(self):
+        os.makedirs(self.metrics_dir, exist_ok=True)
+        path = os.path.join(self.metrics_dir, f"worker-{os.getpid()}.json")
+        with open(path + ".tmp", "w") as file:
+            json.dump(self._state(), file)
+        os.replace(path + ".tmp", path)
+
+    def _merged(self):
+        """Add up this worker's live values and every other live worker's last flush."""
+        values = defaultdict(float)
+        histograms = {}
+        states = [self._state()]
+        if os.path.isdir(self.metrics_dir):
+            for name in os.listdir(self.metrics_dir):
+                if not (name.startswith("worker-") and name.endswith(".json")):
+                    continue
+                try:
+                    pid = int(name[len("worker-"):-len(".json")])
+                except ValueError:
+                    continue
+                path = os.path.join(self.metrics_dir, name)
+                if pid == os.getpid():
+                    continue
+                if not _pid_alive(pid):
+                    # Another worker being scraped at the same time may have removed it already
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(path)
+                    continue
+                try:
+                    with open(path, "r") as file:
+                        states.append(json.load(file))
+                except (OSError, ValueError):
+                    continue
+        for state in states:
+            for name, labels, value in state["values"]:
+                values[(name, tuple(tuple(pair) for pair in labels))] += value
+            for name, labels, histogram in state["histograms"]:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                merged = histograms.setdefault(key, [0] * len(histogram))
+                for i, value in enumerate(histogram):
+                    merged[i] += value
+        return values, histograms
+
+    def render(self, gauges=None):
+        """Prometheus text exposition of all workers, plus gauges computed at scrape time."""
+        values, histograms = self._merged()
+        for name, value in (gauges or {}).items():
+            values[(name, ())] = value
+        lines = []
+        for metric, (kind, help_text) in METRIC_TYPES.items():
+            samples = [(labels, value) for (name, labels), value in sorted(values.items()) if name == metric]
+            series = [(labels, histogram) for (name, labels), histogram in sorted(histograms.items()) if name == metric]
+            if not samples and not series:
+                continue
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for labels, value in samples:
+                lines.append(f"{metric}{_labels(labels)} {_number(value)}")
+            for labels, histogram in series:
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ["+Inf"], histogram):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{_labels(labels + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{metric}_sum{_labels(labels)} {_number(histogram[-2])}")
+                lines.append(f"{metric}_count{_labels(labels)} {histogram[-1]}")
+        return "\n".join(lines) + "\n"
+
+def _number(value):
+    # Full precision, so large counters keep increasing instead of rounding to 6 digits
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+class _Timer:
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+
+# Process-wide registry shared by app.py, broadcast.py and sheets_client.py
+metrics = Metrics()
@@ -0,0 +1,84 @@
+import gzip
+import hashlib
+import mmap
+import os
+from flask import Response
+
+# Brotli is optional; without it clients get gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bytes per write when streaming a mapped file
+MAPPED_CHUNK_SIZE = 64 * 1024
+
+def map_file(path):
+    """Map a file read-only; every process mapping it shares the same page cache."""
+    with open(path, "rb") as file:
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+def _chunks(data):
+    for start in range(0, len(data), MAPPED_CHUNK_SIZE):
+        yield data[start:start + MAPPED_CHUNK_SIZE]
+
+class PreparedResponse:
+    """A response body serialized and compressed once, then served to every request.
+
+    The weak ETag covers all encodings of the same body, so a client that
+    already has it gets a 304 whatever encoding it received.
+    """
+
+    def __init__(self, body, tag, mimetype="application/json", headers=None, encodings=None):
+        self.body = body.encode() if isinstance(body, str) else body
+        self.tag = str(tag)
+        self.etag = f'W/"{self.tag}"'
+        self.mimetype = mimetype
+        self.headers = headers or {}
+        if encodings is None:
+            encodings = {"gzip": gzip.compress(self.body, compresslevel=6)}
+            if brotli is not None:
+                encodings["br"] = brotli.compress(self.body, quality=5)
+        self.encodings = encodings
+
+    @classmethod
+    def for_snapshot(cls, version, body):
+        """Tag a snapshot body with its version and a short content hash."""
+        data = body.encode() if isinstance(body, str) else body
+        return cls(data, f"v{version}-{hashlib.sha1(data).hexdigest()[:12]}",
+                   headers={"X-Snapshot-Version": str(version)})
+
+    @classmethod
+    def for_snapshot_files(cls, version, path, suffixes):
+        """Serve a published snapshot straight from its file and precompressed copies.
+
+        The files are mapped rather than read, so every worker serves the
+        same pages from the OS cache instead of holding its own copy.
+        suffixes maps each Content-Encoding to its file's suffix; missing
+        copies are skipped.
+        """
+        body = map_file(path)
+        encodings = {encoding: map_file(path + suffix) for encoding, suffix in suffixes.items()
+                     if os.path.exists(path + suffix)}
+        return cls(body, f"v{version}-{hashlib.sha1(body).hexdigest()[:12]}",
+                   headers={"X-Snapshot-Version": str(version)}, encodings=encodings)
+
+    def text(self):
+        return self.body[:].decode()
+
+    def _response(self, data, headers):
+        if isinstance(data, bytes):
+            return Response(data, mimetype=self.mimetype, headers=headers)
+        # Mapped files are written out in slices, so no worker holds a full copy
+        headers["Content-Length"] = str(len(data))
+        return Response(_chunks(data), mimetype=self.mimetype, headers=headers, direct_passthrough=True)
+
+    def respond(self, request):
+        headers = {"ETag": self.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding", **self.headers}
+        if request.if_none_match.contains_weak(self.tag):
+            return Response(status=304, headers=headers)
+        for encoding in ("br", "gzip"):
+            if encoding in self.encodings and request.accept_encodings[encoding]:
+                headers["Content-Encoding"] = encoding
+                return self._response(self.encodings[encoding], headers)
+        return self._response(self.body, headers)
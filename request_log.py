@@ -0,0 +1,128 @@
+import fcntl
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+# Append-only log of stock requests and the counts table it is compacted into
+REQUEST_LOG_FILE = os.getenv("REQUEST_LOG_FILE", "requested_stocks.log")
+REQUESTED_STOCKS_FILE = os.getenv("REQUESTED_STOCKS_FILE", "requested_stocks.json")
+# Seconds between compactions of the log into the counts table
+REQUEST_LOG_COMPACT_SECONDS = int(os.getenv("REQUEST_LOG_COMPACT_SECONDS", 300))
+
+class RequestLog:
+    """Stock requests appended to a shared log and periodically folded into a counts table.
+
+    Appends take a shared lock, so workers never wait on each other; only
+    compaction takes the exclusive lock while it rewrites the counts table
+    and truncates the log. Every operation opens its own descriptor, since
+    flock doesn't exclude threads sharing one.
+
+    Each worker keeps the counts table and a tally of the log in memory,
+    reading only the lines appended since its last look.
+    """
+
+    def __init__(self, log_path=REQUEST_LOG_FILE, counts_path=REQUESTED_STOCKS_FILE,
+                 compact_seconds=REQUEST_LOG_COMPACT_SECONDS):
+        self.log_path = log_path
+        self.counts_path = counts_path
+        self.compact_seconds = compact_seconds
+        self.counts = Counter()
+        self.counts_stamp = None
+        # Requests in the log up to offset, i.e. not yet compacted
+        self.pending = Counter()
+        self.offset = 0
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def _open(self):
+        return os.open(self.log_path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def start(self):
+        # Started lazily so each forked worker runs its own compactor
+        with self.lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                threading.Thread(target=self._run, name="request-log-compactor", daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.compact_seconds)
+            self.compact()
+
+    def append(self, symbol):
+        """Record one request with a single O_APPEND write."""
+        record = (json.dumps({"symbol": symbol, "ts": round(time.time(), 3)}) + "\n").encode()
+        fd = self._open()
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            os.write(fd, record)
+        finally:
+            os.close(fd)
+
+    def _read_counts(self):
+        try:
+            with open(self.counts_path, "r") as file:
+                return Counter(json.load(file))
+        except FileNotFoundError:
+            return Counter()
+
+    def _count_lines(self, data, counts):
+        for line in data.decode().splitlines():
+            try:
+                counts[json.loads(line)["symbol"]] += 1
+            except (ValueError, KeyError):
+                print(f"Skipping malformed request log line: {line.strip()}")
+
+    def compact(self):
+        """Fold the log into the counts table and truncate it."""
+        try:
+            fd = self._open()
+        except OSError as e:
+            print(f"Error compacting request log: {e}")
+            return
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            with open(self.log_path, "rb") as file:
+                data = file.read()
+            if not data:
+                return
+            counts = self._read_counts()
+            self._count_lines(data, counts)
+            tmp_path = f"{self.counts_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as file:
+                json.dump(dict(sorted(counts.items())), file, indent=4)
+            os.replace(tmp_path, self.counts_path)
+            os.ftruncate(fd, 0)
+        except Exception as e:
+            print(f"Error compacting request log: {e}")
+        finally:
+            os.close(fd)
+
+    def totals(self):
+        """Return the counts table merged with requests still waiting in the log."""
+        with self.lock:
+            fd = self._open()
+            try:
+                # Compaction swaps the table and truncates the log under the exclusive lock,
+                # so both are seen either before or after it
+                fcntl.flock(fd, fcntl.LOCK_SH)
+                try:
+                    stat = os.stat(self.counts_path)
+                    stamp = (stat.st_ino, stat.st_mtime_ns)
+                except FileNotFoundError:
+                    stamp = None
+                if stamp != self.counts_stamp or os.fstat(fd).st_size < self.offset:
+                    self.counts = self._read_counts()
+                    self.counts_stamp = stamp
+                    self.pending = Counter()
+                    self.offset = 0
+                data = os.pread(fd, os.fstat(fd).st_size - self.offset, self.offset)
+                # Only whole lines; a record being appended right now is picked up next time
+                data = data[:data.rfind(b"\n") + 1]
+                self._count_lines(data, self.pending)
+                self.offset += len(data)
+            finally:
+                os.close(fd)
+            return dict(self.counts + self.pending)
@@ -20,5 +20,6 @@ def run_script(script_name):
         print(f"--- Finished: {script_name} successfully ---")
 
 if __name__ == "__main__":
+    # stockUpdates.py also refreshes the local subscriber list from the Sheet
     run_script("stockUpdates.py")
     run_script("stockAlertsEmail.py")
\ No newline at end of file
@@ -0,0 +1,24 @@
+# gevent is only needed when serving with `gunicorn -k gevent`
+try:
+    from gevent import get_hub
+    from gevent.monkey import get_original, is_module_patched
+except ImportError:
+    get_hub = None
+
+def using_gevent():
+    return get_hub is not None and is_module_patched("threading")
+
+def _on_event_loop():
+    # The real (unpatched) thread ident tells the loop apart from the pool's threads
+    get_ident, main_thread = get_original("threading", ["get_ident", "main_thread"])
+    return get_ident() == main_thread().ident
+
+def run_blocking(func, *args, **kwargs):
+    """Run a blocking call (file I/O, flock, compression) off the gevent event loop.
+
+    Under a gevent worker the call goes to the hub's native thread pool so
+    other connections keep being served; otherwise it runs inline.
+    """
+    if using_gevent() and _on_event_loop():
+        return get_hub().threadpool.apply(func, args, kwargs)
+    return func(*args, **kwargs)
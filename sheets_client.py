@@ -0,0 +1,57 @@
+import os
+import threading
+from googleapiclient.discovery import build
+from google.oauth2.service_account import Credentials
+from metrics import metrics
+
+# One scope for every caller, so a single credential object and token serve them all
+SHEETS_SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+
+_lock = threading.Lock()
+_credentials = {}
+# The HTTP transport under a built service isn't thread-safe, so each thread gets its own
+_local = threading.local()
+
+def credentials():
+    """Service account credentials, read from CREDENTIALS_FILE once per process.
+
+    google-auth refreshes the access token on this object as it expires, so
+    every service built from it shares the same token.
+    """
+    pid = os.getpid()
+    with _lock:
+        if pid not in _credentials:
+            _credentials.clear()
+            _credentials[pid] = Credentials.from_service_account_file(os.getenv("CREDENTIALS_FILE"), scopes=SHEETS_SCOPES)
+        return _credentials[pid]
+
+def service():
+    """The Sheets service for this thread, built once and reused with its open connection."""
+    if getattr(_local, "pid", None) != os.getpid():
+        _local.service = build("sheets", "v4", credentials=credentials(), cache_discovery=False)
+        _local.pid = os.getpid()
+    return _local.service
+
+def values():
+    return service().spreadsheets().values()
+
+def execute(request, operation):
+    """Execute a Sheets API request, recording its latency under the operation name."""
+    with metrics.timer("sheets_request_seconds", operation=operation):
+        return request.execute()
+
+def batch_get(ranges):
+    """Read several (spreadsheet_id, range) pairs with one request per spreadsheet.
+
+    Returns {(spreadsheet_id, range): rows}.
+    """
+    by_sheet = {}
+    for spreadsheet_id, cell_range in ranges:
+        by_sheet.setdefault(spreadsheet_id, []).append(cell_range)
+    result = {}
+    for spreadsheet_id, cell_ranges in by_sheet.items():
+        response = execute(values().batchGet(spreadsheetId=spreadsheet_id, ranges=cell_ranges), "batchGet")
+        # valueRanges come back in the order they were requested
+        for cell_range, value_range in zip(cell_ranges, response.get("valueRanges", [])):
+            result[(spreadsheet_id, cell_range)] = value_range.get("values", [])
+    return result
@@ -0,0 +1,172 @@
+import gzip
+import json
+import os
+import re
+import threading
+
+# Brotli is optional; without it only the gzip copy is published
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Published snapshot and the directory of versioned copies it is swapped from
+DATA_PATH = os.getenv("STOCK_DATA_PATH", "stock_data.json")
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+# Number of versioned snapshot files kept on disk
+SNAPSHOT_KEEP_VERSIONS = int(os.getenv("SNAPSHOT_KEEP_VERSIONS", 5))
+VERSIONED_FILE = re.compile(r"^(?:stock_data|delta)\.v(\d+)\.json(?:\.gz|\.br)?$")
+# Suffix of the precompressed copy published next to each versioned snapshot, by Content-Encoding
+COMPRESSED_SUFFIXES = {"gzip": ".gz", "br": ".br"}
+
+def version_path(data_path=DATA_PATH):
+    return data_path + ".version"
+
+def versioned_path(version, snapshot_dir=SNAPSHOT_DIR):
+    return os.path.join(snapshot_dir, f"stock_data.v{version}.json")
+
+def delta_path(version, snapshot_dir=SNAPSHOT_DIR):
+    return os.path.join(snapshot_dir, f"delta.v{version}.json")
+
+def read_version(data_path=DATA_PATH):
+    """Return the published snapshot version, or 0 if nothing was published yet."""
+    try:
+        with open(version_path(data_path), "r") as file:
+            return int(file.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+    except Exception as e:
+        print(f"Error reading snapshot version: {e}")
+        return 0
+
+def atomic_write(path, text):
+    """Write text (or bytes) to a temporary file next to path, then rename it over path."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb" if isinstance(text, bytes) else "w") as file:
+        file.write(text)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+def publish_snapshot(entries, version, data_path=DATA_PATH, snapshot_dir=SNAPSHOT_DIR):
+    """Write a new versioned snapshot and swap it in as data_path.
+
+    The version file is written last, so a reader that sees a new version
+    is guaranteed to find the matching snapshot and its compressed copies
+    already in place.
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    previous_version = read_version(data_path)
+    path = versioned_path(version, snapshot_dir)
+    body = json.dumps(entries, indent=4)
+    atomic_write(path, body)
+    write_compressed(path, body.encode())
+    write_delta(previous_version, version, entries, snapshot_dir)
+    # Hard-link the versioned file into place so the body is only written once
+    tmp_path = f"{data_path}.{os.getpid()}.tmp"
+    try:
+        os.link(path, tmp_path)
+        os.replace(tmp_path, data_path)
+    except OSError:
+        with open(path, "r") as file:
+            atomic_write(data_path, file.read())
+    atomic_write(version_path(data_path), f"{version}\n")
+    prune_versions(version, snapshot_dir)
+    return version
+
+def write_compressed(path, data):
+    """Publish gzip and brotli copies of a snapshot next to it.
+
+    Compressed once here at the highest levels, so web workers can map the
+    files instead of each compressing the snapshot again.
+    """
+    atomic_write(path + COMPRESSED_SUFFIXES["gzip"], gzip.compress(data, compresslevel=9))
+    if brotli is not None:
+        atomic_write(path + COMPRESSED_SUFFIXES["br"], brotli.compress(data, quality=11))
+
+def diff_snapshots(old_entries, new_entries):
+    """Return (changed entries, removed symbols) between two snapshots."""
+    # Round-trip the new entries so they match ones reloaded from disk (int keys such as the
+    # moving average periods become strings), then compare serialized entries so NaN values
+    # (which never equal themselves) don't count as changes
+    new_entries = json.loads(json.dumps(new_entries))
+    old = {entry["symbol"]: json.dumps(entry, sort_keys=True) for entry in old_entries}
+    new_symbols = {entry["symbol"] for entry in new_entries}
+    changed = [entry for entry in new_entries if old.get(entry["symbol"]) != json.dumps(entry, sort_keys=True)]
+    removed = sorted(symbol for symbol in old if symbol not in new_symbols)
+    return changed, removed
+
+def write_delta(previous_version, version, entries, snapshot_dir=SNAPSHOT_DIR):
+    """Store the changes from the previously published snapshot, if it is still on disk."""
+    try:
+        with open(versioned_path(previous_version, snapshot_dir), "r") as file:
+            previous = json.load(file)
+    except FileNotFoundError:
+        return
+    except Exception as e:
+        print(f"Error reading snapshot v{previous_version} for delta: {e}")
+        return
+    changed, removed = diff_snapshots(previous, entries)
+    delta = {"from": previous_version, "version": version, "changed": changed, "removed": removed}
+    atomic_write(delta_path(version, snapshot_dir), json.dumps(delta))
+    print(f"Snapshot v{version}: {len(changed)} changed, {len(removed)} removed since v{previous_version}")
+
+def changes_since(since, version, snapshot_dir=SNAPSHOT_DIR):
+    """Merge the stored deltas from since up to version.
+
+    Returns {"from", "version", "changed", "removed"}, or None if the chain
+    of deltas back to since is no longer on disk.
+    """
+    deltas = []
+    current = version
+    while current != since:
+        try:
+            with open(delta_path(current, snapshot_dir), "r") as file:
+                delta = json.load(file)
+        except FileNotFoundError:
+            return None
+        if delta["from"] < since or delta["from"] >= current:
+            return None
+        deltas.append(delta)
+        current = delta["from"]
+    changed = {}
+    removed = set()
+    for delta in reversed(deltas):
+        for entry in delta["changed"]:
+            changed[entry["symbol"]] = entry
+            removed.discard(entry["symbol"])
+        for symbol in delta["removed"]:
+            changed.pop(symbol, None)
+            removed.add(symbol)
+    return {"from": since, "version": version, "changed": list(changed.values()), "removed": sorted(removed)}
+
+def prune_versions(current_version, snapshot_dir=SNAPSHOT_DIR, keep=SNAPSHOT_KEEP_VERSIONS):
+    for name in os.listdir(snapshot_dir):
+        match = VERSIONED_FILE.match(name)
+        if match and int(match.group(1)) <= current_version - keep:
+            os.remove(os.path.join(snapshot_dir, name))
+
+class SnapshotCache:
+    """Holds the latest snapshot body in memory and reloads it only when the version changes.
+
+    By default every get() reads the version file. A version_source, such as
+    a watcher thread's current version, makes that an attribute read instead.
+    """
+
+    def __init__(self, loader, data_path=DATA_PATH, version_source=None):
+        self.loader = loader
+        self.data_path = data_path
+        self.version_source = version_source or (lambda: read_version(data_path))
+        self.version = None
+        self.body = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        """Return (version, body), loading a newly published version if there is one."""
+        version = self.version_source()
+        if version != self.version or self.body is None:
+            with self.lock:
+                if version != self.version or self.body is None:
+                    self.body = self.loader(version)
+                    self.version = version
+        return self.version, self.body
@@ -0,0 +1,110 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# SQLite database holding every published snapshot (stock_data.json is exported from it)
+SNAPSHOT_DB_PATH = os.getenv("SNAPSHOT_DB_PATH", "stock_data.db")
+# Number of past runs kept in the snapshots table
+SNAPSHOT_KEEP_RUNS = int(os.getenv("SNAPSHOT_KEEP_RUNS", 30))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS symbols (
+    symbol TEXT PRIMARY KEY,
+    company_name TEXT
+);
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    symbol_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    symbol TEXT NOT NULL REFERENCES symbols(symbol),
+    highlighted INTEGER NOT NULL,
+    current_price REAL,
+    macd REAL,
+    signal REAL,
+    rsi REAL,
+    adx REAL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (run_id, symbol)
+) WITHOUT ROWID;
+"""
+
+def connect(path=SNAPSHOT_DB_PATH):
+    """Open a read-write connection in WAL mode so readers never block the writer."""
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+def write_snapshot(entries, path=SNAPSHOT_DB_PATH, run_id=None, keep_runs=SNAPSHOT_KEEP_RUNS):
+    """Store one pipeline run in a single transaction and return its run id."""
+    conn = connect(path)
+    try:
+        with conn:
+            if run_id is None:
+                run_id = conn.execute("SELECT COALESCE(MAX(run_id), 0) + 1 FROM runs").fetchone()[0]
+            conn.execute("INSERT INTO runs (run_id, created_at, symbol_count) VALUES (?, ?, ?)",
+                         (run_id, time.time(), len(entries)))
+            conn.executemany(
+                "INSERT INTO symbols (symbol, company_name) VALUES (?, ?) "
+                "ON CONFLICT(symbol) DO UPDATE SET company_name = excluded.company_name",
+                [(entry["symbol"], entry.get("company_name")) for entry in entries]
+            )
+            conn.executemany(
+                "INSERT INTO snapshots (run_id, symbol, highlighted, current_price, macd, signal, rsi, adx, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(run_id, entry["symbol"], int(bool(entry.get("highlighted"))), entry.get("current_price"),
+                  entry.get("macd"), entry.get("signal"), entry.get("rsi"), entry.get("adx"), json.dumps(entry))
+                 for entry in entries]
+            )
+            if keep_runs:
+                conn.execute("DELETE FROM snapshots WHERE run_id <= ?", (run_id - keep_runs,))
+                conn.execute("DELETE FROM runs WHERE run_id <= ?", (run_id - keep_runs,))
+        return run_id
+    finally:
+        conn.close()
+
+# Read-only connections are cached per thread
+_readers = threading.local()
+
+def reader(path=SNAPSHOT_DB_PATH):
+    """Return this thread's read-only connection, or None if the database doesn't exist yet."""
+    conn = getattr(_readers, "conn", None)
+    if conn is None:
+        if not os.path.exists(path):
+            return None
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        _readers.conn = conn
+    return conn
+
+def latest_stored_run(path=SNAPSHOT_DB_PATH):
+    """Return the newest run id in the database, or 0 if it is empty or missing."""
+    if not os.path.exists(path):
+        return 0
+    conn = connect(path)
+    try:
+        return latest_run_id(conn) or 0
+    finally:
+        conn.close()
+
+def latest_run_id(conn):
+    return conn.execute("SELECT MAX(run_id) FROM runs").fetchone()[0]
+
+def load_snapshot_json(path=SNAPSHOT_DB_PATH, run_id=None):
+    """Return (run_id, JSON array text) of a run, joining the stored rows without parsing them."""
+    conn = reader(path)
+    if conn is None:
+        return None, None
+    if run_id is None:
+        run_id = latest_run_id(conn)
+    if run_id is None:
+        return None, None
+    rows = conn.execute("SELECT data FROM snapshots WHERE run_id = ?", (run_id,)).fetchall()
+    if not rows:
+        return None, None
+    return run_id, "[" + ",".join(row[0] for row in rows) + "]"
@@ -0,0 +1,118 @@
+import os
+import shutil
+from datetime import date, timedelta
+import pandas as pd
+
+# Date-partitioned Parquet history of every published snapshot:
+#   history/date=YYYY-MM-DD/run-<version>.parquet
+HISTORY_DIR = os.getenv("HISTORY_DIR", "history")
+# Partitions older than this many days are deleted
+HISTORY_RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", 730))
+
+HISTORY_COLUMNS = [
+    "date", "version", "symbol", "company_name", "current_price", "macd", "signal", "rsi",
+    "adx", "+di", "-di", "ma8", "ma20", "ma50", "ma200", "highlighted", "highlight_streak",
+]
+
+def _partition_dir(day, history_dir=HISTORY_DIR):
+    return os.path.join(history_dir, f"date={day.isoformat()}")
+
+def _partition_dates(history_dir=HISTORY_DIR):
+    if not os.path.isdir(history_dir):
+        return []
+    days = []
+    for name in os.listdir(history_dir):
+        if name.startswith("date="):
+            try:
+                days.append(date.fromisoformat(name[len("date="):]))
+            except ValueError:
+                continue
+    return sorted(days)
+
+def snapshot_frame(entries, version, day):
+    """Flatten snapshot entries into one row per symbol with the history columns."""
+    rows = []
+    for entry in entries:
+        moving_averages = entry.get("moving_averages", {})
+        row = {name: entry.get(name) for name in HISTORY_COLUMNS if name in entry}
+        for period in (8, 20, 50, 200):
+            row[f"ma{period}"] = moving_averages.get(period, moving_averages.get(str(period)))
+        rows.append(row)
+    frame = pd.DataFrame(rows).reindex(columns=HISTORY_COLUMNS)
+    frame["date"] = pd.Timestamp(day)
+    frame["version"] = version
+    frame["highlighted"] = frame["highlighted"].fillna(False).astype(bool)
+    frame["highlight_streak"] = frame["highlight_streak"].fillna(0).astype("int64")
+    return frame.sort_values("symbol", ignore_index=True)
+
+def append_snapshot(entries, version, day=None, history_dir=HISTORY_DIR):
+    """Append one run to its date partition. Existing files are never rewritten."""
+    day = day or date.today()
+    try:
+        partition = _partition_dir(day, history_dir)
+        os.makedirs(partition, exist_ok=True)
+        path = os.path.join(partition, f"run-{version}.parquet")
+        snapshot_frame(entries, version, day).to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+        print(f"Appended run {version} ({len(entries)} symbols) to {partition}")
+    except Exception as e:
+        print(f"Error appending snapshot history: {e}")
+
+def compact_history(history_dir=HISTORY_DIR, retention_days=HISTORY_RETENTION_DAYS, today=None):
+    """Drop partitions past retention and merge each closed day's run files into one."""
+    today = today or date.today()
+    cutoff = today - timedelta(days=retention_days)
+    for day in _partition_dates(history_dir):
+        partition = _partition_dir(day, history_dir)
+        if day < cutoff:
+            shutil.rmtree(partition, ignore_errors=True)
+            print(f"Removed expired history partition {partition}")
+            continue
+        run_files = sorted(name for name in os.listdir(partition) if name.startswith("run-") and name.endswith(".parquet"))
+        # Today's partition may still receive runs; closed days with one file are already compact
+        if day >= today or len(run_files) < 2:
+            continue
+        try:
+            merged = pd.concat([pd.read_parquet(os.path.join(partition, name)) for name in run_files])
+            merged = merged.sort_values(["symbol", "version"], ignore_index=True)
+            # Keep the run- prefix so later compactions and readers treat it like any other run file
+            path = os.path.join(partition, f"run-{merged['version'].min()}-{merged['version'].max()}.parquet")
+            merged.to_parquet(path + ".tmp", index=False)
+            os.replace(path + ".tmp", path)
+            for name in run_files:
+                if os.path.join(partition, name) != path:
+                    os.remove(os.path.join(partition, name))
+            print(f"Compacted {len(run_files)} runs in {partition}")
+        except Exception as e:
+            print(f"Error compacting {partition}: {e}")
+
+def read_history(symbols=None, start=None, end=None, columns=None, history_dir=HISTORY_DIR):
+    """Read history rows, pruning partitions by date and row groups by symbol."""
+    files = []
+    for day in _partition_dates(history_dir):
+        if (start and day < start) or (end and day > end):
+            continue
+        partition = _partition_dir(day, history_dir)
+        files.extend(os.path.join(partition, name) for name in sorted(os.listdir(partition))
+                     if name.startswith("run-") and name.endswith(".parquet"))
+    if not files:
+        return pd.DataFrame(columns=HISTORY_COLUMNS)
+    filters = [("symbol", "in", list(symbols))] if symbols else None
+    if columns:
+        columns = list(dict.fromkeys(["date", "version", "symbol", *columns]))
+    frame = pd.concat([pd.read_parquet(path, columns=columns, filters=filters) for path in files])
+    return frame.sort_values(["version", "symbol"], ignore_index=True)
+
+def previous_streaks(history_dir=HISTORY_DIR, lookback_days=14):
+    """Return {symbol: highlight_streak} from the most recent run in the history."""
+    start = date.today() - timedelta(days=lookback_days)
+    frame = read_history(start=start, columns=["highlight_streak"], history_dir=history_dir)
+    if frame.empty:
+        return {}
+    latest = frame[frame["version"] == frame["version"].max()]
+    return dict(zip(latest["symbol"], latest["highlight_streak"].astype(int).tolist()))
+
+def attach_highlight_streaks(entries, streaks):
+    """Count consecutive highlighted runs per symbol, including this one."""
+    for entry in entries:
+        entry["highlight_streak"] = streaks.get(entry["symbol"], 0) + 1 if entry.get("highlighted") else 0
@@ -1,3 +1,8 @@
+// How often the index page checks for new alerts when the server doesn't stream events
+const ALERT_POLL_INTERVAL_MS = 60000;
+// Alert cards shown per page in each section of the index page
+const ALERT_PAGE_SIZE = 60;
+
 document.addEventListener("DOMContentLoaded", () => {
   // Initialize functionality based on the current page
   const pathname = window.location.pathname;
@@ -67,46 +72,103 @@ function setupIndexPage() {
     }
   });
 
-  // Fetch and display stock alerts
+  // Fetch and display the first page of each alert section
   fetchStockAlerts();
 
-  document.getElementById("search-bar").addEventListener("input", (event) => {
-    const query = event.target.value.toLowerCase();
+  // Reload the shown pages whenever a new snapshot is published
+  const updates = new EventSource("/events");
+  updates.onmessage = (event) => {
+    if (Number(event.data) !== alertState.version) {
+      fetchStockAlerts();
+    }
+  };
+  // The stream only closes for good when the server won't hold it open; poll for changes then
+  updates.onerror = () => {
+    if (updates.readyState === EventSource.CLOSED) {
+      setInterval(() => fetchStockAlerts(), ALERT_POLL_INTERVAL_MS);
+    }
+  };
 
-    const filteredAlerts = window.stockAlerts.filter((alert) => {
-      const symbolMatch = alert.symbol.toLowerCase().includes(query);
-      const companyNameMatch = alert.company_name && alert.company_name.toLowerCase().includes(query);
-      return symbolMatch || companyNameMatch;
-    });
+  // Page through each section on the server
+  ["highlighted", "other"].forEach((section) => {
+    const pager = document.getElementById(`${section}-stocks-pager`);
+    pager.querySelector(".prev").addEventListener("click", () => fetchAlertSection(section, alertState.pages[section] - 1));
+    pager.querySelector(".next").addEventListener("click", () => fetchAlertSection(section, alertState.pages[section] + 1));
+  });
 
-    renderStockAlerts(filteredAlerts);
+  // Search on the server once typing pauses, starting both sections over at their first page
+  let searchTimer = null;
+  document.getElementById("search-bar").addEventListener("input", (event) => {
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(() => {
+      alertState.query = event.target.value.trim();
+      alertState.pages = { highlighted: 1, other: 1 };
+      fetchStockAlerts();
+    }, 200);
   });
 }
 
-async function fetchStockAlerts() {
-  try {
-    const response = await fetch("/stock-alerts");
-    const alerts = await response.json();
+// Alerts are searched and paged on the server, one section at a time
+const alertState = { query: "", version: null, pages: { highlighted: 1, other: 1 } };
+
+// Reload the page shown in each section
+function fetchStockAlerts() {
+  return Promise.all([
+    fetchAlertSection("highlighted", alertState.pages.highlighted),
+    fetchAlertSection("other", alertState.pages.other),
+  ]);
+}
 
-    window.stockAlerts = alerts;
-    renderStockAlerts(alerts);
+async function fetchAlertSection(section, page) {
+  const query = alertState.query;
+  const params = new URLSearchParams({
+    highlighted: section === "highlighted",
+    page: Math.max(page, 1),
+    page_size: ALERT_PAGE_SIZE,
+  });
+  if (query) {
+    params.set("q", query);
+  }
+  try {
+    const response = await fetch(`/stock-alerts?${params}`);
+    const result = await response.json();
+    // Ignore responses to a query the user has already replaced
+    if (query !== alertState.query) {
+      return;
+    }
+    alertState.version = result.version;
+    alertState.pages[section] = result.page;
+    renderStockAlerts(document.getElementById(`${section}-stocks`), result.results);
+    renderPager(document.getElementById(`${section}-stocks-pager`), result);
   } catch (error) {
-    console.error("Error fetching stock alerts:", error);
+    console.error(`Error fetching ${section} stock alerts:`, error);
   }
 }
 
-function renderStockAlerts(alerts) {
-  const highlightedContainer = document.getElementById("highlighted-stocks");
-  const otherContainer = document.getElementById("other-stocks");
+function renderPager(pager, result) {
+  const pageCount = Math.max(Math.ceil(result.total / result.page_size), 1);
+  pager.querySelector(".prev").disabled = result.page <= 1;
+  pager.querySelector(".next").disabled = result.page >= pageCount;
+  pager.querySelector(".page-info").textContent =
+    `Page ${Math.min(result.page, pageCount)} of ${pageCount} (${result.total} stock${result.total === 1 ? "" : "s"})`;
+  pager.hidden = pageCount <= 1;
+}
 
-  highlightedContainer.innerHTML = "";
-  otherContainer.innerHTML = "";
+function renderStockAlerts(container, alerts) {
+  container.innerHTML = "";
 
   const sortedAlerts = alerts
     .filter((alert) => alert.current_price !== null && !isNaN(alert.current_price))
     .sort((a, b) => a.symbol.localeCompare(b.symbol));
 
+  const shownSymbols = new Set(sortedAlerts.map((alert) => alert.symbol));
+
   sortedAlerts.forEach((alert) => {
+    // Correlated highlighted stocks are folded under their cluster representative
+    if (alert.cluster && alert.cluster !== alert.symbol && shownSymbols.has(alert.cluster)) {
+      return;
+    }
+
     const card = document.createElement("div");
     card.className = "card";
 
@@ -134,6 +196,14 @@ function renderStockAlerts(alerts) {
       })
       .join("");
 
+    const members = (alert.cluster_members || []).filter((symbol) => shownSymbols.has(symbol));
+    const clusterMembers = members.length
+      ? `<details class="cluster-members" onclick="event.stopPropagation()">
+          <summary>${members.length} correlated stock${members.length > 1 ? "s" : ""}</summary>
+          <p>${members.join(", ")}</p>
+        </details>`
+      : "";
+
     card.innerHTML = `
       <h3>${alert.symbol} (${alert.company_name})</h3>
       <p>Current Price: ${
@@ -147,10 +217,12 @@ function renderStockAlerts(alerts) {
       +DI: <span style="${plusDIStyle}">${alert["+di"]?.toFixed(2) || "N/A"}</span>, 
       -DI: <span style="${minusDIStyle}">${alert["-di"]?.toFixed(2) || "N/A"}</span></p>
       <p>RSI: <span style="color:${rsiColor};">${alert.rsi?.toFixed(2) || "N/A"}</span></p>
+      ${alert.highlight_streak > 1 ? `<p>Highlighted for ${alert.highlight_streak} runs in a row</p>` : ""}
+      ${clusterMembers}
     `;
     card.onclick = () => window.open(`https://finance.yahoo.com/chart/${alert.symbol}`, "_blank");
 
-    (alert.highlighted ? highlightedContainer : otherContainer).appendChild(card);
+    container.appendChild(card);
   });
 }
 
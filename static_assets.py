@@ -0,0 +1,55 @@
+import hashlib
+import mimetypes
+import os
+import re
+from prepared_response import PreparedResponse
+
+# Fingerprinted assets never change under the same name, so browsers may keep them for a year
+IMMUTABLE = {"Cache-Control": "public, max-age=31536000, immutable"}
+STATIC_REFERENCE = re.compile(r'(["\'])/?static/([^"\']+)\1')
+
+def fingerprint(name, body):
+    root, extension = os.path.splitext(name)
+    return f"{root}.{hashlib.sha256(body).hexdigest()[:10]}{extension}"
+
+class StaticAssets:
+    """Static files and HTML pages read, fingerprinted and compressed once at startup.
+
+    Each file under static_dir is served under a content-hash name with
+    immutable caching, and the pages reference those names. The pages
+    themselves and un-fingerprinted asset names revalidate with their ETag.
+    """
+
+    def __init__(self, static_dir="static", pages=(), page_dir="."):
+        self.assets = {}
+        self.fingerprints = {}
+        for root, _, files in os.walk(static_dir):
+            for file_name in files:
+                path = os.path.join(root, file_name)
+                name = os.path.relpath(path, static_dir).replace(os.sep, "/")
+                with open(path, "rb") as file:
+                    body = file.read()
+                mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+                digest = hashlib.sha256(body).hexdigest()[:16]
+                hashed = fingerprint(name, body)
+                self.fingerprints[name] = hashed
+                self.assets[name] = PreparedResponse(body, digest, mimetype)
+                self.assets[hashed] = PreparedResponse(body, digest, mimetype, headers=IMMUTABLE)
+        self.pages = {}
+        for page in pages:
+            with open(os.path.join(page_dir, page), "r", encoding="utf-8") as file:
+                html = STATIC_REFERENCE.sub(self._rewrite, file.read())
+            body = html.encode()
+            self.pages[page] = PreparedResponse(body, hashlib.sha256(body).hexdigest()[:16], "text/html")
+        print(f"Prepared {len(self.fingerprints)} static assets and {len(self.pages)} pages")
+
+    def _rewrite(self, match):
+        quote, name = match.groups()
+        return f"{quote}/static/{self.fingerprints.get(name, name)}{quote}"
+
+    def asset(self, name):
+        """The prepared response for an asset by its plain or fingerprinted name, or None."""
+        return self.assets.get(name)
+
+    def page(self, name):
+        return self.pages[name]
@@ -1,23 +1,32 @@
 import yfinance as yf
 import smtplib
 from email.mime.text import MIMEText
-from googleapiclient.discovery import build
-from google.oauth2.service_account import Credentials
 from datetime import datetime
 import os
 from dotenv import load_dotenv
 from collections import defaultdict
 import requests
-import json
-import warnings
 import pandas as pd
 import numpy as np
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from retrying import retry
 import argparse
 import multiprocessing
+from stock_scoring import top_k
+import indicators
+from bar_store import build_panel, save_panel, save_series
+from cross_section import BENCHMARK_SYMBOL, compute_cross_section, attach_cross_section
+from timeframes import compute_timeframes, attach_timeframes
+from clustering import cluster_highlighted, attach_clusters
+from snapshot_db import write_snapshot, latest_stored_run
+from snapshot import read_version, publish_snapshot
+from snapshot_history import append_snapshot, compact_history, previous_streaks, attach_highlight_streaks
+from checkpoint import RunCheckpoint
+from subscribers import list_subscribers, parse_sheet_emails, sync_from_sheet
+import sheets_client
 
 parser = argparse.ArgumentParser(description="Stock Analysis Script")
+parser.add_argument("--run-id", help="Resume the pipeline run with this id from its last completed stage")
 args = parser.parse_args()
 
 load_dotenv()
@@ -28,23 +37,30 @@ EMAIL = os.getenv("EMAIL")
 PASSWORD = os.getenv("PASSWORD")
 Subscriber_SHEET_ID = os.getenv("SubscriberList_SHEET_ID")
 Stocks_Sheet_ID = os.getenv("StocksList_SHEET_ID")
-CREDENTIALS_FILE = os.getenv("CREDENTIALS_FILE")
 DATA_FILE = "stock_data.json"
 SITE_URL = "http://localhost:5000/notify"
+EMAIL_TOP_N = int(os.getenv("EMAIL_TOP_N", 0)) or None
 
 def read_stock_symbols_from_sheet():
+    # The subscriber list rides along in the same batchGet when it lives in the symbols spreadsheet
+    ranges = [(Stocks_Sheet_ID, "A:B")]
+    if Subscriber_SHEET_ID == Stocks_Sheet_ID:
+        ranges.append((Subscriber_SHEET_ID, "A:A"))
     try:
-        creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=["https://www.googleapis.com/auth/spreadsheets.readonly"])
-        service = build("sheets", "v4", credentials=creds)
-        sheet = service.spreadsheets()
-        result = sheet.values().get(spreadsheetId=Stocks_Sheet_ID, range="A:B").execute()
-        values = result.get("values", [])
+        fetched = sheets_client.batch_get(ranges)
+        values = fetched[(Stocks_Sheet_ID, "A:B")]
         result = {row[0]: row[1] for row in values[1:] if len(row) > 1}
         print(f"Fetched {len(result)} stock symbols from Google Sheet")
-        return result
     except Exception as e:
         print(f"Error fetching stock symbols from Google Sheets: {e}")
         return {}
+    # A failed subscriber sync only leaves the previous local list in place
+    try:
+        rows = fetched.get((Subscriber_SHEET_ID, "A:A"))
+        sync_from_sheet(sheet_emails=parse_sheet_emails(rows) if rows is not None else None)
+    except Exception as e:
+        print(f"Error syncing subscribers from Google Sheets: {e}")
+    return result
 
 @retry(stop_max_attempt_number=1, wait_fixed=500)
 def fetch_stock_data_batch(symbols, period="1y"):
@@ -54,24 +70,38 @@ def fetch_stock_data_batch(symbols, period="1y"):
         print(f"Error fetching stock data for batch {symbols[:5]}...: {e}")
         raise
 
-def fetch_stock_data(symbols, period="1y", batch_size=100):
+def fetch_stock_data(symbols, period="1y", batch_size=100, checkpoint=None):
     all_data = {}
     print(f"Fetching data for {len(symbols)} stocks")
     failed_symbols = []
     for i in range(0, len(symbols), batch_size):
         batch = symbols[i:i + batch_size]
+        stage = f"fetch-batch-{i // batch_size}"
+        if checkpoint and checkpoint.done(stage):
+            batch_data, batch_failed = checkpoint.load(stage)
+            print(f"Reusing checkpointed batch {batch[:5]}...")
+            all_data.update(batch_data)
+            failed_symbols.extend(batch_failed)
+            continue
         try:
             data = fetch_stock_data_batch(batch, period)
+            batch_data = {}
+            batch_failed = []
             if isinstance(data, pd.DataFrame):
                 if len(batch) == 1:
-                    all_data[batch[0]] = data
+                    batch_data[batch[0]] = data
                 else:
                     for symbol in batch:
                         if symbol in data.columns.levels[0]:
-                            all_data[symbol] = data[symbol]
+                            batch_data[symbol] = data[symbol]
                         else:
-                            all_data[symbol] = pd.DataFrame()
-                            failed_symbols.append(symbol)
+                            batch_data[symbol] = pd.DataFrame()
+                            batch_failed.append(symbol)
+            all_data.update(batch_data)
+            failed_symbols.extend(batch_failed)
+            # Batches that raised are not checkpointed, so a resumed run fetches them again
+            if checkpoint:
+                checkpoint.save(stage, (batch_data, batch_failed))
         except Exception as e:
             print(f"Failed to fetch batch {batch[:5]}...: {e}")
             failed_symbols.extend(batch)
@@ -84,7 +114,7 @@ def calculate_moving_averages(data, periods):
     try:
         for period in periods:
             if len(data) >= period:
-                moving_averages[period] = data['Close'].rolling(window=period).mean().iloc[-1]
+                moving_averages[period] = indicators.moving_averages(data['Close'], [period])[period].iloc[-1]
             else:
                 print(f"Insufficient data for {period}-day MA: only {len(data)} days available")
     except Exception as e:
@@ -93,59 +123,23 @@ def calculate_moving_averages(data, periods):
 
 def calculate_macd(data):
     try:
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore", category=pd.errors.SettingWithCopyWarning)
-            data['EMA12'] = data['Close'].ewm(span=12, adjust=False).mean()
-            data['EMA26'] = data['Close'].ewm(span=26, adjust=False).mean()
-            data['MACD'] = data['EMA12'] - data['EMA26']
-            data['Signal_Line'] = data['MACD'].ewm(span=9, adjust=False).mean()
-        return data['MACD'].iloc[-1], data['Signal_Line'].iloc[-1]
+        macd, signal = indicators.macd(data['Close'])
+        return macd.iloc[-1], signal.iloc[-1]
     except Exception as e:
         print(f"Error calculating MACD: {e}")
         return None, None
 
 def calculate_rsi(data, period=14):
     try:
-        delta = data['Close'].diff(1)
-        gain = delta.where(delta > 0, 0)
-        loss = -delta.where(delta < 0, 0)
-        avg_gain = gain.ewm(alpha=1/period, adjust=False).mean()
-        avg_loss = loss.ewm(alpha=1/period, adjust=False).mean()
-        rs = avg_gain / avg_loss
-        rsi = 100 - (100 / (1 + rs))
-        return rsi.iloc[-1]
+        return indicators.rsi(data['Close'], period).iloc[-1]
     except Exception as e:
         print(f"Error calculating RSI: {e}")
         return None
 
-def rma(x, n):
-    y = x.ewm(alpha=1/n, adjust=False).mean()
-    return y
-
 def calculate_adx(df, n=14):
     try:
         df = df.copy()
-        df['TR'] = pd.concat([
-            (df['High'] - df['Low']),
-            (df['High'] - df['Close'].shift()).abs(),
-            (df['Low'] - df['Close'].shift()).abs()
-        ], axis=1).max(axis=1)
-
-        df['+DM'] = df['High'].diff().clip(lower=0)
-        df['-DM'] = (-df['Low'].diff()).clip(lower=0)
-        df.loc[df['+DM'] < df['-DM'], '+DM'] = 0
-        df.loc[df['-DM'] < df['+DM'], '-DM'] = 0
-
-        df['TR_rma'] = rma(df['TR'], n)
-        df['+DM_rma'] = rma(df['+DM'], n)
-        df['-DM_rma'] = rma(df['-DM'], n)
-
-        df['+DI'] = 100 * df['+DM_rma'] / df['TR_rma']
-        df['-DI'] = 100 * df['-DM_rma'] / df['TR_rma']
-        df['DX'] = (100 * (df['+DI'] - df['-DI']).abs() /
-                    (df['+DI'] + df['-DI']))
-
-        df['ADX'] = rma(df['DX'], n)
+        df['ADX'], df['+DI'], df['-DI'] = indicators.adx(df['High'], df['Low'], df['Close'], n)
         df['+DI'] = df['+DI'].fillna(0)
         df['-DI'] = df['-DI'].fillna(0)
         df['ADX'] = df['ADX'].fillna(0)
@@ -204,9 +198,14 @@ def format_alert_email(alerts, stock_data_dict):
     for alert in alerts:
         if alert and alert["highlighted"]:
             alerts_by_symbol[alert["symbol"].upper()].append(alert)
-    sorted_symbols = sorted(alerts_by_symbol.keys())
+    # Correlated stocks are folded under their cluster's representative
+    representatives = [entries[0] for entries in alerts_by_symbol.values()
+                       if entries[0].get("cluster", entries[0]["symbol"]) == entries[0]["symbol"]]
+    ranked = top_k(representatives, EMAIL_TOP_N)
+    sorted_symbols = [alert["symbol"].upper() for _, alert in ranked]
+    scores = {alert["symbol"].upper(): score for score, alert in ranked}
     
-    body = "<html><body><h2><a href='http://34.24.10.62:5000/#stock-alerts-section'>Highlighted Stocks</a></h2><table cellpadding='0' cellspacing='0' style='border-collapse:collapse; width:100%; font-family: Arial, sans-serif; margin-bottom:20px;'><tr style='background-color:#f2f2f2;'><th style='border:1px solid #cccccc; border-bottom:3px solid #000000; padding:8px 12px;'>Stock</th><th style='border:1px solid #cccccc; border-bottom:3px solid #000000; padding:8px 12px;'>Current Price</th><th style='border:1px solid #cccccc; border-bottom:3px solid #000000; padding:8px 12px;'>20-day MA</th><th style='border:1px solid #cccccc; border-bottom:3px solid #000000; padding:8px 12px;'>8-day MA</th><th style='border:1px solid #cccccc; border-bottom:3px solid #000000; padding:8px 12px;'>50-day MA</th><th style='border:1px solid #cccccc; border-bottom:3px solid #000000; padding:8px 12px;'>200-day MA</th><th style='border:1px solid #cccccc; border-bottom:3px solid #000000; padding:8px 12px;'>MACD</th><th style='border:1px solid #cccccc; border-bottom:3px solid #000000; padding:8px 12px;'>Signal</th><th style='border:1px solid #cccccc; border-bottom:3px solid #000000; padding:8px 12px;'>RSI</th><th style='border:1px solid #cccccc; border-bottom:3px solid #000000; padding:8px 12px;'>ADX</th><th style='border:1px solid #cccccc; border-bottom:3px solid #000000; padding:8px 12px;'>+DI</th><th style='border:1px solid #cccccc; border-bottom:3px solid #000000; padding:8px 12px;'>-DI</th></tr>"
+    body = "<html><body><h2><a href='http://34.24.10.62:5000/#stock-alerts-section'>Highlighted Stocks</a></h2><table cellpadding='0' cellspacing='0' style='border-collapse:collapse; width:100%; font-family: Arial, sans-serif; margin-bottom:20px;'><tr style='background-color:#f2f2f2;'><th style='border:1px solid #cccccc; border-bottom:3px solid #000000; padding:8px 12px;'>Stock</th><th style='border:1px solid #cccccc; border-bottom:3px solid #000000; padding:8px 12px;'>Current Price</th><th style='border:1px solid #cccccc; border-bottom:3px solid #000000; padding:8px 12px;'>20-day MA</th><th style='border:1px solid #cccccc; border-bottom:3px solid #000000; padding:8px 12px;'>8-day MA</th><th style='border:1px solid #cccccc; border-bottom:3px solid #000000; padding:8px 12px;'>50-day MA</th><th style='border:1px solid #cccccc; border-bottom:3px solid #000000; padding:8px 12px;'>200-day MA</th><th style='border:1px solid #cccccc; border-bottom:3px solid #000000; padding:8px 12px;'>MACD</th><th style='border:1px solid #cccccc; border-bottom:3px solid #000000; padding:8px 12px;'>Signal</th><th style='border:1px solid #cccccc; border-bottom:3px solid #000000; padding:8px 12px;'>RSI</th><th style='border:1px solid #cccccc; border-bottom:3px solid #000000; padding:8px 12px;'>ADX</th><th style='border:1px solid #cccccc; border-bottom:3px solid #000000; padding:8px 12px;'>+DI</th><th style='border:1px solid #cccccc; border-bottom:3px solid #000000; padding:8px 12px;'>-DI</th><th style='border:1px solid #cccccc; border-bottom:3px solid #000000; padding:8px 12px;'>Score</th></tr>"
     
     for i, symbol in enumerate(sorted_symbols):
         alert = alerts_by_symbol[symbol][0]
@@ -217,11 +216,17 @@ def format_alert_email(alerts, stock_data_dict):
         macd_color = "green" if alert["macd"] > alert["signal"] else "red"
         rsi_color = "green" if 50 <= alert["rsi"] < 70 else "yellow" if alert["rsi"] >= 70 else "red"
         
+        streak = alert.get("highlight_streak", 0)
+        streak_note = f"<br><span style='font-size:11px; color:#555555;'>Highlighted {streak} runs in a row</span>" if streak > 1 else ""
+        
         def format_ma(period):
             value = alert["moving_averages"].get(str(period), alert["moving_averages"].get(period, 0))
             return f"<span style='color:blue; font-weight:bold;'>${value:.2f}</span>"
         
-        body += f"<tr style='background-color:{row_bg}; border-bottom:3px solid #000000;'><td style='border:1px solid #cccccc; padding:8px 12px; text-align:center;'><a href='{yahoo_link}' style='text-decoration:underline; color:blue;'><strong>{symbol} ({company_name})</strong></a></td><td style='border:1px solid #cccccc; padding:8px 12px; text-align:center;'><span style='color:green; font-weight:bold;'>${current_price:.2f}</span></td><td style='border:1px solid #cccccc; padding:8px 12px; text-align:center;'>{format_ma(20)}</td><td style='border:1px solid #cccccc; padding:8px 12px; text-align:center;'>{format_ma(8)}</td><td style='border:1px solid #cccccc; padding:8px 12px; text-align:center;'>{format_ma(50)}</td><td style='border:1px solid #cccccc; padding:8px 12px; text-align:center;'>{format_ma(200)}</td><td style='border:1px solid #cccccc; padding:8px 12px; text-align:center;'><span style='color:{macd_color}; font-weight:bold;'>{alert['macd']:.2f}</span></td><td style='border:1px solid #cccccc; padding:8px 12px; text-align:center;'><span style='color:black; font-weight:bold;'>{alert['signal']:.2f}</span></td><td style='border:1px solid #cccccc; padding:8px 12px; text-align:center;'><span style='color:{rsi_color}; font-weight:bold;'>{alert['rsi']:.2f}</span></td><td style='border:1px solid #cccccc; padding:8px 12px; text-align:center;'><span style='color:black; font-weight:bold;'>{alert['adx']:.2f}</span></td><td style='border:1px solid #cccccc; padding:8px 12px; text-align:center;'><span style='color:green; font-weight:bold;'>{alert['+di']:.2f}</span></td><td style='border:1px solid #cccccc; padding:8px 12px; text-align:center;'><span style='color:red; font-weight:bold;'>{alert['-di']:.2f}</span></td></tr>"
+        body += f"<tr style='background-color:{row_bg}; border-bottom:3px solid #000000;'><td style='border:1px solid #cccccc; padding:8px 12px; text-align:center;'><a href='{yahoo_link}' style='text-decoration:underline; color:blue;'><strong>{symbol} ({company_name})</strong></a>{streak_note}</td><td style='border:1px solid #cccccc; padding:8px 12px; text-align:center;'><span style='color:green; font-weight:bold;'>${current_price:.2f}</span></td><td style='border:1px solid #cccccc; padding:8px 12px; text-align:center;'>{format_ma(20)}</td><td style='border:1px solid #cccccc; padding:8px 12px; text-align:center;'>{format_ma(8)}</td><td style='border:1px solid #cccccc; padding:8px 12px; text-align:center;'>{format_ma(50)}</td><td style='border:1px solid #cccccc; padding:8px 12px; text-align:center;'>{format_ma(200)}</td><td style='border:1px solid #cccccc; padding:8px 12px; text-align:center;'><span style='color:{macd_color}; font-weight:bold;'>{alert['macd']:.2f}</span></td><td style='border:1px solid #cccccc; padding:8px 12px; text-align:center;'><span style='color:black; font-weight:bold;'>{alert['signal']:.2f}</span></td><td style='border:1px solid #cccccc; padding:8px 12px; text-align:center;'><span style='color:{rsi_color}; font-weight:bold;'>{alert['rsi']:.2f}</span></td><td style='border:1px solid #cccccc; padding:8px 12px; text-align:center;'><span style='color:black; font-weight:bold;'>{alert['adx']:.2f}</span></td><td style='border:1px solid #cccccc; padding:8px 12px; text-align:center;'><span style='color:green; font-weight:bold;'>{alert['+di']:.2f}</span></td><td style='border:1px solid #cccccc; padding:8px 12px; text-align:center;'><span style='color:red; font-weight:bold;'>{alert['-di']:.2f}</span></td><td style='border:1px solid #cccccc; padding:8px 12px; text-align:center;'><span style='color:black; font-weight:bold;'>{scores[symbol]:.2f}</span></td></tr>"
+        if alert.get("cluster_members"):
+            members = ", ".join(f"{member} ({stock_data_dict.get(member, 'Unknown')})" for member in alert["cluster_members"])
+            body += f"<tr style='background-color:{row_bg};'><td colspan='13' style='border:1px solid #cccccc; padding:6px 12px; font-size:12px; color:#555555;'>Moves with {symbol}: {members}</td></tr>"
     
     body += "</table></body></html>"
     print(f"Generated email content for {len(sorted_symbols)} highlighted stocks")
@@ -229,23 +234,22 @@ def format_alert_email(alerts, stock_data_dict):
 
 def get_subscriber_emails():
     try:
-        creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=["https://www.googleapis.com/auth/spreadsheets.readonly"])
-        service = build("sheets", "v4", credentials=creds)
-        sheet = service.spreadsheets()
-        result = sheet.values().get(spreadsheetId=Subscriber_SHEET_ID, range="A:A").execute()
-        values = result.get("values", [])
-        result = [row[0] for row in values if row]
+        result = list_subscribers(preference="alerts")
+        if not result:
+            # Populate the local mirror the first time; afterwards subscribers.py sync keeps it current
+            sync_from_sheet()
+            result = list_subscribers(preference="alerts")
         print(f"Fetched {len(result)} subscriber emails")
         return result
     except Exception as e:
-        print(f"Error fetching emails from Google Sheets: {e}")
+        print(f"Error fetching subscriber emails: {e}")
         return []
 
 def send_alerts(alerts, stock_data_dict):
     recipients = get_subscriber_emails()
     if not recipients:
         print("No subscribers found. Exiting.")
-        return
+        return False
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     subject = f"Stock Price Alerts - {timestamp}"
     body = format_alert_email(alerts, stock_data_dict)
@@ -259,8 +263,10 @@ def send_alerts(alerts, stock_data_dict):
             msg['To'] = 'undisclosed-recipients:;'
             server.sendmail(EMAIL, recipients, msg.as_string())
         print(f"Sent alerts to {len(recipients)} recipients using BCC")
+        return True
     except Exception as e:
         print(f"Error sending email alerts: {e}")
+        return False
 
 def save_to_file(data, file_path):
     try:
@@ -285,10 +291,16 @@ def save_to_file(data, file_path):
                 
             fully_validated_data.append(entry)
 
-        with open(file_path, "w") as file:
-            json.dump(fully_validated_data, file, indent=4)
-            
-        print(f"Saved {len(fully_validated_data)} fully completed stock entries to {file_path}")
+        # The database run and the published JSON share one monotonically increasing version
+        version = max(read_version(file_path), latest_stored_run()) + 1
+        write_snapshot(fully_validated_data, run_id=version)
+        print(f"Stored run {version} with {len(fully_validated_data)} entries in the snapshot database")
+
+        publish_snapshot(fully_validated_data, version, file_path)
+        print(f"Published version {version} with {len(fully_validated_data)} fully completed stock entries to {file_path}")
+
+        append_snapshot(fully_validated_data, version)
+        return version
     except Exception as e:
         print(f"Error saving stock data to file: {e}")
 
@@ -297,19 +309,13 @@ def notify_site():
         response = requests.post(SITE_URL)
         if response.status_code == 200:
             print("Website notified of new data")
-        else:
-            print(f"Failed to notify website: {response.status_code}")
+            return True
+        print(f"Failed to notify website: {response.status_code}")
     except Exception as e:
         print(f"Error notifying website: {e}")
+    return False
 
-if __name__ == "__main__":
-    print("Starting stock analysis...")
-    stock_data_dict = read_stock_symbols_from_sheet()
-    if not stock_data_dict:
-        print("No stock symbols found in Google Sheet. Exiting.")
-        exit()
-    stock_symbols = list(stock_data_dict.keys())
-    stock_data = fetch_stock_data(stock_symbols)
+def compute_stock_entries(stock_symbols, stock_data, stock_data_dict, panel):
     all_stock_data = []
     alerts = []
     processed_count = 0
@@ -341,9 +347,39 @@ if __name__ == "__main__":
                 skipped_count += 1
     print(f"Processed {processed_count}/{len(stock_symbols)} stocks, skipped {skipped_count}")
     print(f"Generated {len(alerts)} alerts")
-    save_to_file(all_stock_data, DATA_FILE)
+    attach_cross_section(all_stock_data, compute_cross_section(all_stock_data, panel.get("Close")))
+    attach_timeframes(all_stock_data, compute_timeframes(panel))
+    clusters = cluster_highlighted(all_stock_data, panel.get("Close"))
+    attach_clusters(all_stock_data, clusters)
+    attach_clusters(alerts, clusters)
+    streaks = previous_streaks()
+    attach_highlight_streaks(all_stock_data, streaks)
+    attach_highlight_streaks(alerts, streaks)
+    return all_stock_data, alerts
+
+if __name__ == "__main__":
+    # Each stage is checkpointed under the run id; pass --run-id to resume a failed run
+    checkpoint = RunCheckpoint(args.run_id)
+    print(f"Starting stock analysis (run {checkpoint.run_id})...")
+    stock_data_dict = checkpoint.run("universe", read_stock_symbols_from_sheet)
+    if not stock_data_dict:
+        print("No stock symbols found in Google Sheet. Exiting.")
+        checkpoint.finish()
+        exit()
+    stock_symbols = list(stock_data_dict.keys())
+    fetch_symbols = stock_symbols if BENCHMARK_SYMBOL in stock_symbols else stock_symbols + [BENCHMARK_SYMBOL]
+    stock_data = checkpoint.timed("fetch", fetch_stock_data, fetch_symbols, checkpoint=checkpoint)
+    panel = build_panel(stock_data)
+    save_panel(panel)
+    if panel:
+        save_series(panel, indicators.indicator_panel(panel["High"], panel["Low"], panel["Close"]))
+    all_stock_data, alerts = checkpoint.run("compute", compute_stock_entries, stock_symbols, stock_data, stock_data_dict, panel)
+    checkpoint.run("save", save_to_file, all_stock_data, DATA_FILE)
+    compact_history()
     if alerts:
-        send_alerts(alerts, stock_data_dict)
-        notify_site()
+        checkpoint.run("email", send_alerts, alerts, stock_data_dict)
+        checkpoint.run("notify", notify_site)
     else:
         print("No alerts generated")
+    checkpoint.finish()
+    checkpoint.prune()
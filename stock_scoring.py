@@ -0,0 +1,95 @@
+import heapq
+import json
+import os
+
+# Relative weight of each indicator component in the composite score.
+# Override with SCORE_WEIGHTS, e.g. '{"ma_distance": 2, "rsi_position": 0.5}'
+DEFAULT_SCORE_WEIGHTS = {
+    "ma_distance": 1.0,
+    "macd_histogram": 1.0,
+    "adx_strength": 1.0,
+    "rsi_position": 1.0,
+}
+
+MA_PERIODS = [8, 20, 50, 200]
+
+def load_score_weights():
+    """Return the score weights, applying any overrides from SCORE_WEIGHTS."""
+    weights = dict(DEFAULT_SCORE_WEIGHTS)
+    raw = os.getenv("SCORE_WEIGHTS")
+    if not raw:
+        return weights
+    try:
+        for name, value in json.loads(raw).items():
+            if name in weights:
+                weights[name] = float(value)
+            else:
+                print(f"Ignoring unknown score weight: {name}")
+    except Exception as e:
+        print(f"Error parsing SCORE_WEIGHTS, using defaults: {e}")
+    return weights
+
+def _clip(value, limit):
+    return max(-limit, min(limit, value)) / limit
+
+def get_moving_average(stock, period):
+    # Moving average keys are ints in memory and strings once loaded from JSON
+    moving_averages = stock.get("moving_averages") or {}
+    return moving_averages.get(str(period), moving_averages.get(period))
+
+def score_components(stock):
+    """Normalize each indicator to roughly [-1, 1], higher meaning more bullish."""
+    price = float(stock["current_price"])
+    distances = []
+    for period in MA_PERIODS:
+        avg = get_moving_average(stock, period)
+        if avg:
+            distances.append((price - avg) / avg * 100)
+    ma_distance = _clip(sum(distances) / len(distances), 20) if distances else 0.0
+
+    histogram = float(stock.get("macd", 0)) - float(stock.get("signal", 0))
+    macd_histogram = _clip(histogram / price * 100, 2) if price else 0.0
+
+    # ADX measures trend strength only; the DI spread gives it a direction
+    direction = 1 if stock.get("+di", 0) > stock.get("-di", 0) else -1
+    adx_strength = direction * min(float(stock.get("adx", 0)), 50) / 50
+
+    # Peaks in the middle of the 50-70 band used by the highlight rule
+    rsi_position = 1 - min(abs(float(stock.get("rsi", 0)) - 60) / 40, 2)
+
+    return {
+        "ma_distance": ma_distance,
+        "macd_histogram": macd_histogram,
+        "adx_strength": adx_strength,
+        "rsi_position": rsi_position,
+    }
+
+def composite_score(stock, weights=None):
+    """Weighted sum of the score components for a single stock entry."""
+    if weights is None:
+        weights = load_score_weights()
+    components = score_components(stock)
+    return sum(weights.get(name, 0) * value for name, value in components.items())
+
+def top_k(stocks, k=None, weights=None):
+    """Return (score, stock) pairs for the k best stocks, best first.
+
+    Uses a bounded heap so only k entries are kept while scanning the
+    universe. With no k every stock is returned, fully sorted.
+    """
+    if weights is None:
+        weights = load_score_weights()
+    scored = []
+    for stock in stocks:
+        try:
+            scored.append((composite_score(stock, weights), stock))
+        except Exception as e:
+            print(f"Error scoring {stock.get('symbol', 'UNKNOWN')}: {e}")
+    key = lambda pair: pair[0]
+    if k is None or k >= len(scored):
+        return sorted(scored, key=key, reverse=True)
+    return heapq.nlargest(k, scored, key=key)
+
+def rank_stocks(stocks, k=None, weights=None):
+    """Return copies of the top stock entries with a "score" field added."""
+    return [dict(stock, score=round(score, 4)) for score, stock in top_k(stocks, k, weights)]
@@ -0,0 +1,281 @@
+import fcntl
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from dotenv import load_dotenv
+import sheets_client
+
+load_dotenv()
+
+# Local mirror of the subscriber Sheet, read by both email scripts
+SUBSCRIBERS_DB_PATH = os.getenv("SUBSCRIBERS_DB_PATH", "subscribers.db")
+# Seconds between pushes of queued subscribe/unsubscribe changes to the Sheet
+SUBSCRIBER_FLUSH_SECONDS = float(os.getenv("SUBSCRIBER_FLUSH_SECONDS", 15))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscribers (
+    email_key TEXT PRIMARY KEY,
+    email TEXT NOT NULL,
+    active INTEGER NOT NULL DEFAULT 1,
+    preferences TEXT NOT NULL DEFAULT '{}',
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS subscribers_active ON subscribers (active);
+CREATE TABLE IF NOT EXISTS sync_state (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    email_key TEXT NOT NULL,
+    email TEXT NOT NULL,
+    action TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+def normalize_email(email):
+    return email.strip().lower()
+
+def connect(path=SUBSCRIBERS_DB_PATH):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+def list_subscribers(preference=None, default=True, path=SUBSCRIBERS_DB_PATH):
+    """Return active subscriber emails, optionally only those with a preference enabled."""
+    conn = connect(path)
+    try:
+        rows = conn.execute("SELECT email, preferences FROM subscribers WHERE active = 1 ORDER BY email_key").fetchall()
+    finally:
+        conn.close()
+    if preference is None:
+        return [email for email, _ in rows]
+    return [email for email, preferences in rows if json.loads(preferences).get(preference, default)]
+
+def set_preference(email, name, value, path=SUBSCRIBERS_DB_PATH):
+    """Set one preference for a subscriber; returns False if the email isn't known."""
+    conn = connect(path)
+    try:
+        with conn:
+            row = conn.execute("SELECT preferences FROM subscribers WHERE email_key = ?", (normalize_email(email),)).fetchone()
+            if row is None:
+                return False
+            preferences = json.loads(row[0])
+            preferences[name] = value
+            conn.execute("UPDATE subscribers SET preferences = ?, updated_at = ? WHERE email_key = ?",
+                         (json.dumps(preferences), time.time(), normalize_email(email)))
+        return True
+    finally:
+        conn.close()
+
+def subscribe(email, path=SUBSCRIBERS_DB_PATH):
+    """Activate a subscriber locally and queue the Sheet append; returns (success, message)."""
+    key = normalize_email(email)
+    conn = connect(path)
+    try:
+        with conn:
+            row = conn.execute("SELECT active FROM subscribers WHERE email_key = ?", (key,)).fetchone()
+            if row and row[0]:
+                return False, f"{email} is already subscribed."
+            now = time.time()
+            conn.execute(
+                "INSERT INTO subscribers (email_key, email, active, updated_at) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT(email_key) DO UPDATE SET email = excluded.email, active = 1, updated_at = excluded.updated_at",
+                (key, email.strip(), now)
+            )
+            conn.execute("INSERT INTO outbox (email_key, email, action, created_at) VALUES (?, ?, 'add', ?)",
+                         (key, email.strip(), now))
+        return True, f"Thank you for subscribing! {email} subscribed successfully."
+    finally:
+        conn.close()
+
+def unsubscribe(email, path=SUBSCRIBERS_DB_PATH):
+    """Deactivate a subscriber locally and queue the Sheet removal; returns False if not subscribed."""
+    key = normalize_email(email)
+    conn = connect(path)
+    try:
+        with conn:
+            row = conn.execute("SELECT email FROM subscribers WHERE email_key = ? AND active = 1", (key,)).fetchone()
+            if row is None:
+                return False
+            now = time.time()
+            conn.execute("UPDATE subscribers SET active = 0, updated_at = ? WHERE email_key = ?", (now, key))
+            conn.execute("INSERT INTO outbox (email_key, email, action, created_at) VALUES (?, ?, 'remove', ?)",
+                         (key, row[0], now))
+        return True
+    finally:
+        conn.close()
+
+def parse_sheet_emails(rows):
+    return [row[0].strip() for row in rows if row and row[0].strip()]
+
+def read_sheet_emails():
+    result = sheets_client.execute(sheets_client.values().get(spreadsheetId=os.getenv("SubscriberList_SHEET_ID"), range="A:A"), "get")
+    return parse_sheet_emails(result.get("values", []))
+
+def flush_outbox(path=SUBSCRIBERS_DB_PATH):
+    """Push queued changes to the Sheet with one read and one write; returns the number applied.
+
+    Only the latest queued action per email counts. Additions alone are one
+    append; any removal rewrites the column once, blanking the rows freed at
+    the bottom. Queued rows are deleted only after the Sheet write succeeds.
+    """
+    conn = connect(path)
+    try:
+        queued = conn.execute("SELECT id, email_key, email, action FROM outbox ORDER BY id").fetchall()
+        if not queued:
+            return 0
+        latest = {key: (email, action) for _, key, email, action in queued}
+        values = sheets_client.values()
+        sheet_id = os.getenv("SubscriberList_SHEET_ID")
+        sheet_rows = sheets_client.execute(values.get(spreadsheetId=sheet_id, range="A:A"), "get").get("values", [])
+        column = [row[0].strip() if row else "" for row in sheet_rows]
+        on_sheet = {normalize_email(email) for email in column if email}
+        removals = {key for key, (_, action) in latest.items() if action == "remove" and key in on_sheet}
+        additions = [email for key, (email, action) in latest.items() if action == "add" and key not in on_sheet]
+        if removals:
+            kept = [email for email in column if email and normalize_email(email) not in removals] + additions
+            sheets_client.execute(values.update(
+                spreadsheetId=sheet_id,
+                range=f"A1:A{max(len(column), len(kept))}",
+                valueInputOption="RAW",
+                body={"values": [[email] for email in kept] + [[""]] * (len(column) - len(kept))}
+            ), "update")
+        elif additions:
+            sheets_client.execute(values.append(
+                spreadsheetId=sheet_id,
+                range="A:A",
+                valueInputOption="USER_ENTERED",
+                body={"values": [[email] for email in additions]}
+            ), "append")
+        with conn:
+            # Only changes read above are cleared; ones queued during the flush stay for the next pass
+            conn.execute("DELETE FROM outbox WHERE id <= ?", (queued[-1][0],))
+        print(f"Pushed subscriber changes to Google Sheet: {len(additions)} added, {len(removals)} removed")
+        return len(additions) + len(removals)
+    finally:
+        conn.close()
+
+def has_synced(path=SUBSCRIBERS_DB_PATH):
+    conn = connect(path)
+    try:
+        return conn.execute("SELECT 1 FROM sync_state WHERE name = 'sheet_digest'").fetchone() is not None
+    finally:
+        conn.close()
+
+class SheetWriter:
+    """Background thread that pushes the subscriber outbox to the Sheet in batches.
+
+    Each web worker runs one; a lock file makes sure only one of them
+    flushes at a time. A failed flush leaves the outbox for the next pass.
+    """
+
+    def __init__(self, path=SUBSCRIBERS_DB_PATH, interval=SUBSCRIBER_FLUSH_SECONDS):
+        self.path = path
+        self.interval = interval
+        self.wake = threading.Event()
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def start(self):
+        # Started lazily so each forked worker runs its own writer
+        with self.lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                threading.Thread(target=self._run, name="subscriber-writer", daemon=True).start()
+
+    def poke(self):
+        """Flush soon instead of waiting for the interval."""
+        self.start()
+        self.wake.set()
+
+    def _run(self):
+        while True:
+            self.flush()
+            self.wake.wait(self.interval)
+            # Let a burst of requests queue up before writing
+            time.sleep(1)
+            self.wake.clear()
+
+    def flush(self):
+        with open(self.path + ".flush.lock", "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            try:
+                if not has_synced(self.path):
+                    # An empty mirror would treat every existing subscriber as new
+                    sync_from_sheet(self.path)
+                flush_outbox(self.path)
+            except Exception as e:
+                print(f"Error pushing subscriber changes to Google Sheets: {e}")
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def sync_from_sheet(path=SUBSCRIBERS_DB_PATH, sheet_emails=None):
+    """Bring the local store in line with the Sheet, touching only rows that changed.
+
+    Emails removed from the Sheet are deactivated rather than deleted so
+    their preferences survive a re-subscribe. Returns (added, removed).
+    """
+    if sheet_emails is None:
+        sheet_emails = read_sheet_emails()
+    sheet = {normalize_email(email): email for email in sheet_emails}
+    digest = hashlib.sha256("\n".join(sorted(sheet)).encode()).hexdigest()
+    conn = connect(path)
+    try:
+        with conn:
+            row = conn.execute("SELECT value FROM sync_state WHERE name = 'sheet_digest'").fetchone()
+            if row and row[0] == digest:
+                print("Subscriber list unchanged since last sync")
+                return 0, 0
+            active = {key for (key,) in conn.execute("SELECT email_key FROM subscribers WHERE active = 1")}
+            # Changes still queued for the Sheet win over what the Sheet says now
+            queued = {key for (key,) in conn.execute("SELECT DISTINCT email_key FROM outbox")}
+            added = [key for key in sheet if key not in active and key not in queued]
+            removed = [key for key in active if key not in sheet and key not in queued]
+            now = time.time()
+            conn.executemany(
+                "INSERT INTO subscribers (email_key, email, active, updated_at) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT(email_key) DO UPDATE SET email = excluded.email, active = 1, updated_at = excluded.updated_at",
+                [(key, sheet[key], now) for key in added]
+            )
+            conn.executemany("UPDATE subscribers SET active = 0, updated_at = ? WHERE email_key = ?",
+                             [(now, key) for key in removed])
+            conn.execute("INSERT OR REPLACE INTO sync_state (name, value) VALUES ('sheet_digest', ?)", (digest,))
+        print(f"Synced subscribers from Google Sheet: {len(added)} added, {len(removed)} removed")
+        return len(added), len(removed)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "sync"
+    if command == "sync":
+        try:
+            sync_from_sheet()
+        except Exception as e:
+            print(f"Error syncing subscribers from Google Sheets: {e}")
+            sys.exit(1)
+    elif command == "flush":
+        try:
+            flush_outbox()
+        except Exception as e:
+            print(f"Error pushing subscriber changes to Google Sheets: {e}")
+            sys.exit(1)
+    elif command == "set-pref" and len(sys.argv) == 5:
+        # e.g. python subscribers.py set-pref someone@example.com chart_alerts true
+        email, name, value = sys.argv[2:]
+        if set_preference(email, name, json.loads(value)):
+            print(f"Set {name}={value} for {email}")
+        else:
+            print(f"{email} is not a known subscriber")
+    else:
+        print("Usage: python subscribers.py [sync | flush | set-pref <email> <name> <json value>]")
+        sys.exit(1)
@@ -0,0 +1,45 @@
+import numpy as np
+from bar_store import load_series
+
+# Default and largest number of points returned by /api/symbol/<symbol>/history
+DEFAULT_HISTORY_POINTS = 500
+MAX_HISTORY_POINTS = 2000
+
+def lttb(values, points):
+    """Largest-Triangle-Three-Buckets: indices of `points` samples that keep the shape of values.
+
+    NaN values are treated as 0 when choosing samples; the first and last
+    samples are always kept.
+    """
+    n = len(values)
+    if points >= n or points < 3:
+        return np.arange(n)
+    y = np.nan_to_num(np.asarray(values, dtype=float))
+    x = np.arange(n, dtype=float)
+    edges = np.linspace(1, n - 1, points - 1).astype(int)
+    selected = [0]
+    for i in range(points - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (the last point for the final bucket)
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+        a = selected[-1]
+        areas = np.abs((x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a]))
+        selected.append(start + int(areas.argmax()))
+    selected.append(n - 1)
+    return np.array(selected)
+
+def symbol_history(symbol, start=None, end=None, points=DEFAULT_HISTORY_POINTS):
+    """Return aligned bar and indicator series for one symbol, downsampled on Close."""
+    series = load_series(symbol, start, end)
+    if series.empty:
+        return None
+    points = min(max(points, 3), MAX_HISTORY_POINTS)
+    if "close" in series.columns:
+        series = series.iloc[lttb(series["close"].to_numpy(), points)]
+    payload = {"symbol": symbol, "dates": [day.strftime("%Y-%m-%d") for day in series.index]}
+    for name in series.columns:
+        values = series[name].to_numpy(dtype=float)
+        payload[name] = [None if np.isnan(value) else round(float(value), 4) for value in values]
+    return payload
@@ -0,0 +1,79 @@
+import pandas as pd
+import indicators
+
+# Pandas resample rules for the higher timeframes built from the daily bar panel
+TIMEFRAMES = {"weekly": "W-FRI", "monthly": "ME"}
+
+# Fewer bars are available on higher timeframes, so the 200-period MA is left out
+TIMEFRAME_MA_PERIODS = [8, 20, 50]
+
+def resample_panel(panel, rule):
+    """Resample every symbol of a daily OHLCV panel to a coarser bar size in one pass."""
+    resampled = {}
+    for field, frame in panel.items():
+        bars = frame.resample(rule)
+        if field == "Open":
+            resampled[field] = bars.first()
+        elif field == "High":
+            resampled[field] = bars.max()
+        elif field == "Low":
+            resampled[field] = bars.min()
+        elif field == "Close":
+            resampled[field] = bars.last()
+        elif field == "Volume":
+            resampled[field] = bars.sum(min_count=1)
+    return resampled
+
+def latest_indicators(panel, ma_periods=TIMEFRAME_MA_PERIODS):
+    """Run the indicator engine over a panel and keep the latest value per symbol."""
+    close = panel["Close"]
+    # Carry the last close forward so symbols missing the final bar still report
+    columns = {"close": close.ffill().iloc[-1]}
+    for period, average in indicators.moving_averages(close, ma_periods).items():
+        columns[f"ma{period}"] = average.iloc[-1]
+    macd, signal = indicators.macd(close)
+    columns["macd"] = macd.iloc[-1]
+    columns["signal"] = signal.iloc[-1]
+    columns["rsi"] = indicators.rsi(close).iloc[-1]
+    if "High" in panel and "Low" in panel:
+        adx, plus_di, minus_di = indicators.adx(panel["High"], panel["Low"], close)
+        columns["adx"] = adx.iloc[-1]
+        columns["+di"] = plus_di.iloc[-1]
+        columns["-di"] = minus_di.iloc[-1]
+    return pd.DataFrame(columns)
+
+def compute_timeframes(panel, timeframes=TIMEFRAMES):
+    """Return {timeframe: symbols x indicators frame} for each higher timeframe."""
+    if "Close" not in panel or panel["Close"].empty:
+        return {}
+    return {name: latest_indicators(resample_panel(panel, rule)) for name, rule in timeframes.items()}
+
+# Screening rules that combine the daily entry with its higher timeframes
+TIMEFRAME_RULES = {
+    "weekly_trend_confirmed": lambda entry, frames: (
+        entry["macd"] > entry["signal"]
+        and frames["weekly"].get("close", 0) > frames["weekly"].get("ma20", float("inf"))
+    ),
+    "monthly_trend_confirmed": lambda entry, frames: (
+        entry["current_price"] > frames["monthly"].get("ma8", float("inf"))
+        and frames["monthly"].get("macd", 0) > frames["monthly"].get("signal", 0)
+    ),
+}
+
+def attach_timeframes(entries, tables, rules=TIMEFRAME_RULES):
+    """Store higher-timeframe indicators and rule results on each entry."""
+    if not tables:
+        return
+    records = {name: table.round(4).to_dict(orient="index") for name, table in tables.items()}
+    for entry in entries:
+        frames = {}
+        for name, table in records.items():
+            values = table.get(entry["symbol"], {})
+            frames[name] = {key: value for key, value in values.items() if not pd.isna(value)}
+        entry["timeframes"] = frames
+        entry["rules"] = {}
+        for rule_name, rule in rules.items():
+            try:
+                entry["rules"][rule_name] = bool(rule(entry, frames))
+            except Exception as e:
+                print(f"Error evaluating {rule_name} for {entry['symbol']}: {e}")